@@ -1,95 +1,246 @@
 import webbrowser
 import subprocess
-import requests
+import http_client
+import metrics
+import fcntl
 import json
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from flask import Flask, request, jsonify
 from settings import CREDENTIALS  # Aseg
 
 
 app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
 
 TOKEN_FILE = "config/tokens.json"
+TOKEN_LOCK_FILE = f"{TOKEN_FILE}.lock"
 TOKEN_URL = "https://api.mercadolibre.com/oauth/token"
 
-def load_tokens():
-    """Carga los tokens desde el archivo JSON"""
-    if not os.path.exists(TOKEN_FILE):
-        raise FileNotFoundError(f"El archivo {TOKEN_FILE} no existe. Debes autenticar primero.")
+# --- Tokens en memoria ---
+# Los tokens se sirven desde memoria y el archivo se vuelve a leer solo cuando cambia
+# (ej. otra cuenta autorizada desde otro proceso); basta un stat por llamada. Se renuevan
+# TOKEN_REFRESH_MARGIN segundos antes de vencer (con un hilo en segundo plano y, por
+# las dudas, al pedirlos). Solo hay una renovación a la vez por cuenta: dentro del
+# proceso con un lock por cuenta y entre workers de gunicorn con un flock sobre
+# TOKEN_LOCK_FILE; si otro worker ya renovó, se toma su token del archivo.
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "600"))
+TOKEN_CHECK_SECONDS = float(os.getenv("TOKEN_CHECK_SECONDS", "60"))
+
+_tokens = None
+_tokens_version = None  # (st_mtime_ns, st_ino) del archivo leído
+_tokens_lock = threading.Lock()
+_refresh_locks = {}
+_refresher = None
+
+
+@contextmanager
+def _file_lock():
+    """Lock exclusivo entre procesos sobre el archivo de tokens."""
+    os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
+    with open(TOKEN_LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 
+def _read_token_file():
+    """Lee el archivo de tokens. Los tokens sin 'expires_at' lo calculan con la fecha del archivo."""
     with open(TOKEN_FILE, "r") as file:
         try:
-            tokens = json.load(file)
-            if not tokens:
-                raise ValueError("El archivo de tokens está vacío.")
-            return tokens
+            data = json.load(file)
         except json.JSONDecodeError:
             raise ValueError(f"El archivo {TOKEN_FILE} no tiene un formato JSON válido.")
 
-def save_tokens(cuenta, tokens):
-    """Guarda los tokens en un archivo JSON."""
-    try:
-        with open(TOKEN_FILE, "r") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
+    modified_at = os.path.getmtime(TOKEN_FILE)
+    for tokens in data.values():
+        if "expires_at" not in tokens and "expires_in" in tokens:
+            tokens["expires_at"] = modified_at + tokens["expires_in"]
+    return data
 
-    data[cuenta] = tokens
 
-    with open(TOKEN_FILE, "w") as f:
+def _write_token_file(data):
+    """Escribe el archivo de tokens de forma atómica (archivo temporal + rename)."""
+    tmp_path = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f, indent=4)
+    os.replace(tmp_path, TOKEN_FILE)
+
+
+def _needs_refresh(tokens):
+    expires_at = tokens.get("expires_at")
+    return expires_at is not None and expires_at - time.time() <= TOKEN_REFRESH_MARGIN
+
+
+def _file_version():
+    stat = os.stat(TOKEN_FILE)
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def _set_tokens(data):
+    """Reemplaza los tokens en memoria por los recién leídos o escritos en el archivo."""
+    global _tokens, _tokens_version
+    with _tokens_lock:
+        _tokens = data
+        try:
+            _tokens_version = _file_version()
+        except FileNotFoundError:
+            _tokens_version = None
+
+
+def load_tokens():
+    """Devuelve los tokens de todas las cuentas (desde memoria; el archivo se relee si cambió)."""
+    global _tokens, _tokens_version
+    with _tokens_lock:
+        try:
+            version = _file_version()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"El archivo {TOKEN_FILE} no existe. Debes autenticar primero.")
+        if _tokens is None or version != _tokens_version:
+            _tokens = _read_token_file()
+            _tokens_version = version
+        if not _tokens:
+            raise ValueError("El archivo de tokens está vacío.")
+        return {cuenta: dict(tokens) for cuenta, tokens in _tokens.items()}
+
+
+def save_tokens(cuenta, tokens):
+    """Guarda los tokens de una cuenta en memoria y en el archivo JSON."""
+    tokens = dict(tokens)
+    if "expires_in" in tokens:
+        tokens["expires_at"] = time.time() + tokens["expires_in"]
 
-def refresh_token(cuenta):
-    """Renueva el access_token usando el refresh_token guardado."""
+    with _file_lock():
+        try:
+            data = _read_token_file()
+        except (FileNotFoundError, ValueError):
+            data = {}
+        data[cuenta] = tokens
+        _write_token_file(data)
+        _set_tokens(data)
+
+
+def refresh_token(cuenta, stale_access_token=None):
+    """
+    Renueva el access_token usando el refresh_token guardado.
+
+    Si mientras se esperaba el lock otro hilo o worker ya lo renovó, se usa ese token.
+
+    :param cuenta: Clave de CREDENTIALS.
+    :param stale_access_token: Token que se quiere reemplazar; por defecto el actual en memoria.
+    :return: Los tokens nuevos o None si no se pudo renovar.
+    """
     try:
-        with open(TOKEN_FILE, "r") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        current = load_tokens().get(cuenta, {})
+    except (FileNotFoundError, ValueError):
         return None
+    stale_access_token = stale_access_token or current.get("access_token")
 
-    if cuenta not in data:
-        return None
+    with _tokens_lock:
+        lock = _refresh_locks.setdefault(cuenta, threading.Lock())
 
-    refresh_token = data[cuenta].get("refresh_token")
-    if not refresh_token:
-        return None
+    with lock, _file_lock():
+        try:
+            data = _read_token_file()
+        except (FileNotFoundError, ValueError):
+            return None
 
-    creds = CREDENTIALS[cuenta]
+        tokens = data.get(cuenta)
+        if not tokens:
+            return None
+        if tokens.get("access_token") != stale_access_token and not _needs_refresh(tokens):
+            _set_tokens(data)
+            return tokens
 
-    payload = {
-        "grant_type": "refresh_token",
-        "client_id": creds["client_id"],
-        "client_secret": creds["client_secret"],
-        "refresh_token": refresh_token,
-    }
+        refresh_token = tokens.get("refresh_token")
+        if not refresh_token:
+            return None
+
+        creds = CREDENTIALS[cuenta]
+
+        payload = {
+            "grant_type": "refresh_token",
+            "client_id": creds["client_id"],
+            "client_secret": creds["client_secret"],
+            "refresh_token": refresh_token,
+        }
+
+        response = http_client.post(TOKEN_URL, data=payload, account=cuenta)
+        if response.status_code != 200:
+            logging.error(f"Error al renovar el token de {cuenta}: {response.status_code} - {response.text}")
+            return None
 
-    response = requests.post(TOKEN_URL, data=payload)
-    if response.status_code == 200:
         new_tokens = response.json()
-        save_tokens(cuenta, new_tokens)
-        return new_tokens
-    else:
-        return None
-    
-def get_user_info(cuenta):
-    """Obtiene información del usuario autenticado en MercadoLibre."""
+        new_tokens["expires_at"] = time.time() + new_tokens.get("expires_in", 0)
+        data[cuenta] = new_tokens
+        _write_token_file(data)
+        _set_tokens(data)
+    return new_tokens
+
+
+def get_access_token(cuenta):
+    """
+    Devuelve un access_token vigente para la cuenta, renovándolo si está por vencer.
+
+    :return: El access_token o None si la cuenta no tiene tokens.
+    """
+    start_token_refresher()
     try:
-        with open(TOKEN_FILE, "r") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        tokens = load_tokens().get(cuenta)
+    except (FileNotFoundError, ValueError):
         return None
-
-    if cuenta not in data:
+    if not tokens:
         return None
 
-    access_token = data[cuenta].get("access_token")
+    if _needs_refresh(tokens):
+        refreshed = refresh_token(cuenta, tokens.get("access_token"))
+        if refreshed:
+            return refreshed.get("access_token")
+    return tokens.get("access_token")
+
+
+def _refresh_periodically():
+    while True:
+        time.sleep(TOKEN_CHECK_SECONDS)
+        try:
+            tokens = load_tokens()
+        except (FileNotFoundError, ValueError):
+            continue
+        for cuenta, data in tokens.items():
+            if cuenta in CREDENTIALS and _needs_refresh(data):
+                try:
+                    refresh_token(cuenta, data.get("access_token"))
+                except Exception as e:
+                    logging.error(f"Error al renovar el token de {cuenta}: {e}")
+
+
+def start_token_refresher():
+    """Arranca (una vez por proceso) el hilo que renueva los tokens antes de que venzan."""
+    global _refresher
+    with _tokens_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_periodically, daemon=True)
+            _refresher.start()
+
+
+def get_user_info(cuenta):
+    """Obtiene información del usuario autenticado en MercadoLibre."""
+    access_token = get_access_token(cuenta)
     if not access_token:
         return None
 
     url = "https://api.mercadolibre.com/users/me"
-    headers = {"Authorization": f"Bearer {access_token}"}
-
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, token=access_token, account=cuenta)
+    if response.status_code == 401:
+        # Token revocado o vencido antes de lo previsto: se renueva una vez y se reintenta
+        refreshed = refresh_token(cuenta, access_token)
+        if refreshed:
+            response = http_client.get(url, token=refreshed["access_token"], account=cuenta)
     return response.json()
 
 @app.route("/auth", methods=["GET"])
@@ -134,7 +285,7 @@ def callback(cuenta):
         "redirect_uri": creds["redirect_uri"],
     }
 
-    response = requests.post(TOKEN_URL, data=payload)
+    response = http_client.post(TOKEN_URL, data=payload, account=cuenta)
     if response.status_code == 200:
         tokens = response.json()
         save_tokens(cuenta, tokens)
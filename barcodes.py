@@ -0,0 +1,126 @@
+import os
+import threading
+
+import numpy as np
+
+import metrics
+
+# --- Validación de códigos de barras ---
+# Sin construir objetos de python-barcode: se revisan los dígitos directamente y en
+# lote con NumPy. Los resultados se guardan en memoria para no revalidar los mismos
+# códigos en cada snapshot del inventario.
+#
+# validar_codigo_barras reproduce exactamente la validación anterior con EAN13 de
+# python-barcode, que no revisa el dígito de control (lo recalcula): un código es
+# válido si tiene 13 caracteres y los primeros 12 son dígitos decimales, o si tiene
+# 12 y los primeros 11 lo son (se rellena con "0" y se toman 12). La verificación real del
+# dígito de control (EAN-13, UPC-A y EAN-8) está en validar_digito_control.
+
+BARCODE_CACHE_MAX = int(os.getenv("BARCODE_CACHE_MAX", "500000"))
+LONGITUDES_CONTROL = (8, 12, 13)  # EAN-8, UPC-A y EAN-13
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _validar(codigo):
+    if len(codigo) == 13:
+        return codigo[:12].isdecimal()
+    if len(codigo) == 12:
+        return codigo[:11].isdecimal()
+    return False
+
+
+def _validar_lote(codigos):
+    """Versión vectorizada de _validar para una lista de códigos (str)."""
+    # NumPy descarta los '\0' finales de los strings; esos códigos van por _validar
+    resultado = np.zeros(len(codigos), dtype=bool)
+    if not codigos:
+        return resultado
+
+    longitudes = np.fromiter(map(len, codigos), dtype=np.int64, count=len(codigos))
+    arreglo = np.array(codigos, dtype=str)
+    for longitud, prefijo in ((13, 12), (12, 11)):
+        indices = np.flatnonzero(longitudes == longitud)
+        if indices.size:
+            resultado[indices] = np.char.isdecimal(arreglo[indices].astype(f"<U{prefijo}"))
+
+    for i, codigo in enumerate(codigos):
+        if "\0" in codigo:
+            resultado[i] = _validar(codigo)
+    return resultado
+
+
+def validar_codigo_barras(codigo):
+    """Valida si un código de barras es EAN-13 o UPC."""
+    valido = _cache.get(codigo)
+    metrics.record_cache("barcodes", hits=int(valido is not None), misses=int(valido is None))
+    if valido is None:
+        valido = _validar(codigo)
+        _recordar({codigo: valido})
+    return valido
+
+
+def validar_codigos_barras(codigos):
+    """
+    Valida una columna de códigos de barras de una vez.
+
+    :param codigos: Lista de códigos (str).
+    :return: Arreglo de NumPy de booleanos, mismo orden que codigos.
+    """
+    codigos = list(codigos)
+    conocidos = {codigo: _cache.get(codigo) for codigo in codigos}
+    pendientes = [codigo for codigo, valido in conocidos.items() if valido is None]
+    metrics.record_cache("barcodes", hits=len(conocidos) - len(pendientes), misses=len(pendientes))
+    if pendientes:
+        nuevos = dict(zip(pendientes, _validar_lote(pendientes).tolist()))
+        conocidos.update(nuevos)
+        _recordar(nuevos)
+    return np.array([conocidos[codigo] for codigo in codigos], dtype=bool)
+
+
+def _recordar(resultados):
+    with _cache_lock:
+        if len(_cache) + len(resultados) > BARCODE_CACHE_MAX:
+            _cache.clear()  # Catálogo de códigos renovado: se empieza de nuevo
+        _cache.update(resultados)
+
+
+# --- Dígito de control ---
+
+def _pesos(longitud):
+    """Pesos 3/1 alternados desde el dígito anterior al de control."""
+    return np.array([3 if (longitud - 2 - i) % 2 == 0 else 1 for i in range(longitud - 1)], dtype=np.int64)
+
+
+def validar_digito_control(codigo):
+    """True si el código es un EAN-13, UPC-A o EAN-8 con dígito de control correcto."""
+    if len(codigo) not in LONGITUDES_CONTROL or not (codigo.isascii() and codigo.isdigit()):
+        return False
+    digitos = [int(c) for c in codigo]
+    suma = sum(d * p for d, p in zip(digitos, _pesos(len(codigo)).tolist()))
+    return (10 - suma % 10) % 10 == digitos[-1]
+
+
+def validar_digitos_control(codigos):
+    """
+    Versión en lote de validar_digito_control.
+
+    :param codigos: Lista de códigos (str).
+    :return: Arreglo de NumPy de booleanos, mismo orden que codigos.
+    """
+    codigos = list(codigos)
+    resultado = np.zeros(len(codigos), dtype=bool)
+
+    for longitud in LONGITUDES_CONTROL:
+        indices = [
+            i for i, codigo in enumerate(codigos)
+            if len(codigo) == longitud and codigo.isascii() and codigo.isdigit()
+        ]
+        if not indices:
+            continue
+        crudo = "".join(codigos[i] for i in indices).encode("ascii")
+        digitos = (np.frombuffer(crudo, dtype=np.uint8).reshape(len(indices), longitud) - ord("0")).astype(np.int64)
+        control = (10 - (digitos[:, :-1] @ _pesos(longitud)) % 10) % 10
+        resultado[indices] = control == digitos[:, -1]
+    return resultado
@@ -0,0 +1,385 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+# --- Dobles locales de MercadoLibre, Shopify y Logi ---
+# Servidores Flask que responden los endpoints que usa el servicio, con latencia,
+# errores 5xx y 429 configurables. Cada llamada se cuenta por servicio y plantilla
+# de ruta (ej. "ml GET /items/<item_id>") para medir llamadas upstream por operación.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_ITEM = os.path.join(RAIZ, "original.json")
+
+ML_SITE = "MCO"
+SHOPIFY_HOST = "bench.myshopify.com"
+SHOPIFY_CDN_HOST = "cdn.shopify.com"
+IMAGENES_POR_SKU = 3
+
+
+def sku_bench(indice):
+    return f"BENCH-{indice:05d}"
+
+
+class Simulacion:
+    """
+    Comportamiento común de los dobles: latencia, fallas y conteo de llamadas.
+
+    :param latencia: Segundos de latencia base por llamada.
+    :param jitter: Segundos de variación aleatoria (uniforme) sobre la latencia.
+    :param tasa_error: Fracción de llamadas que responden 500.
+    :param tasa_429: Fracción de llamadas que responden 429 con Retry-After.
+    :param retry_after: Valor del encabezado Retry-After de los 429.
+    """
+
+    def __init__(self, latencia=0.0, jitter=0.0, tasa_error=0.0, tasa_429=0.0, retry_after="1", seed=None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_error = tasa_error
+        self.tasa_429 = tasa_429
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._llamadas = Counter()
+        self._lock = threading.Lock()
+
+    def instalar(self, app, servicio, sin_fallas=()):
+        """Agrega a una app el before_request que cuenta, demora y hace fallar llamadas."""
+
+        @app.before_request
+        def _simular():
+            plantilla = request.url_rule.rule if request.url_rule else request.path
+            with self._lock:
+                self._llamadas[f"{servicio} {request.method} {plantilla}"] += 1
+                demora = self.latencia + self._random.uniform(0, self.jitter)
+                sorteo = self._random.random()
+            if demora > 0:
+                time.sleep(demora)
+            if plantilla in sin_fallas:
+                return None
+            if sorteo < self.tasa_429:
+                return jsonify({"message": "too_many_requests", "status": 429}), 429, {"Retry-After": self.retry_after}
+            if sorteo < self.tasa_429 + self.tasa_error:
+                return jsonify({"message": "internal_error", "status": 500}), 500
+            return None
+
+    def llamadas(self):
+        """Copia del contador de llamadas {"servicio MÉTODO plantilla": cantidad}."""
+        with self._lock:
+            return Counter(self._llamadas)
+
+
+# --- MercadoLibre ---
+
+def _cargar_fixture():
+    with open(FIXTURE_ITEM, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _con_sku(atributos, sku):
+    atributos = [attr for attr in atributos if attr.get("id") != "SELLER_SKU"]
+    atributos.append({"id": "SELLER_SKU", "name": "SKU", "value_id": None, "value_name": sku})
+    return atributos
+
+
+def crear_publicaciones(skus, tasa_full=0.25, seed=None):
+    """
+    Arma publicaciones a partir de original.json: una tradicional por SKU y, para una
+    fracción de los SKUs, otra por Full.
+
+    :return: Tupla ({item_id: publicación}, {sku: [item_ids]}).
+    """
+    base = _cargar_fixture()
+    azar = random.Random(seed)
+    publicaciones, por_sku = {}, {}
+
+    for indice, sku in enumerate(skus):
+        tipos = ["cross_docking"] + (["fulfillment"] if azar.random() < tasa_full else [])
+        for n, logistic_type in enumerate(tipos):
+            item_id = f"{ML_SITE}{1_000_000_000 + indice * 10 + n}"
+            item = copy.deepcopy(base)
+            item.update({"id": item_id, "status": "active", "catalog_listing": False, "seller_custom_field": None})
+            item["shipping"]["logistic_type"] = logistic_type
+            item["attributes"] = _con_sku(item.get("attributes") or [], sku)
+            for variacion in item.get("variations") or []:
+                variacion["id"] = int(item_id[len(ML_SITE):]) * 100
+                variacion["available_quantity"] = azar.randint(0, 20)
+                variacion["attributes"] = _con_sku(variacion.get("attributes") or [], sku)
+            publicaciones[item_id] = item
+            por_sku.setdefault(sku, []).append(item_id)
+    return publicaciones, por_sku
+
+
+def _id_usuario(token):
+    """Los tokens del benchmark tienen la forma BENCH-<cuenta>-<n>; el usuario sale de la cuenta."""
+    partes = (token or "").split("-")
+    if len(partes) < 3 or partes[0] != "BENCH":
+        return None
+    return 100_000 + zlib.crc32(partes[1].encode()) % 900_000
+
+
+def _token_de(req):
+    autorizacion = req.headers.get("Authorization", "")
+    return autorizacion[len("Bearer "):] if autorizacion.startswith("Bearer ") else None
+
+
+def crear_mercadolibre(simulacion, skus, seed=None):
+    """App que emula la API de MercadoLibre sobre un conjunto de publicaciones en memoria."""
+    app = Flask("bench_mercadolibre")
+    publicaciones, por_sku = crear_publicaciones(skus, seed=seed)
+    orden = sorted(publicaciones)
+    flex = {}
+    creadas = Counter()
+    lock = threading.Lock()
+
+    simulacion.instalar(app, "ml", sin_fallas=("/oauth/token",))
+
+    @app.before_request
+    def _autorizar():
+        if request.path != "/oauth/token" and _id_usuario(_token_de(request)) is None:
+            return jsonify({"message": "invalid_token", "status": 401}), 401
+        return None
+
+    def _campos(item, atributos):
+        if not atributos:
+            return item
+        return {campo: item[campo] for campo in ["id", *atributos.split(",")] if campo in item}
+
+    @app.route("/items", methods=["GET"])
+    def multiget():
+        ids = [item_id for item_id in request.args.get("ids", "").split(",") if item_id]
+        if len(ids) > 20:
+            return jsonify({"message": "Too many ids", "status": 400}), 400
+        atributos = request.args.get("attributes")
+        with lock:
+            return jsonify([
+                {"code": 200, "body": _campos(publicaciones[item_id], atributos)} if item_id in publicaciones
+                else {"code": 404, "body": {"message": f"Item {item_id} not found"}}
+                for item_id in ids
+            ])
+
+    @app.route("/items/<item_id>", methods=["GET"])
+    def obtener_item(item_id):
+        with lock:
+            item = publicaciones.get(item_id)
+            return (jsonify(item), 200) if item else (jsonify({"message": "not_found"}), 404)
+
+    @app.route("/items/<item_id>", methods=["PUT"])
+    def actualizar_item(item_id):
+        cambios = request.get_json(force=True)
+        with lock:
+            item = publicaciones.get(item_id)
+            if item is None:
+                return jsonify({"message": "not_found"}), 404
+            cantidades = {var["id"]: var["available_quantity"] for var in cambios.get("variations", [])}
+            for variacion in item.get("variations") or []:
+                if variacion["id"] in cantidades:
+                    variacion["available_quantity"] = cantidades[variacion["id"]]
+            if "status" in cambios:
+                item["status"] = cambios["status"]
+            return jsonify({"id": item_id, "status": item["status"]})
+
+    @app.route("/items", methods=["POST"])
+    def publicar():
+        payload = request.get_json(force=True)
+        with lock:
+            creadas["n"] += 1
+            item_id = f"{ML_SITE}{2_000_000_000 + creadas['n']}"
+        return jsonify({"id": item_id, "title": payload.get("title"), "status": "active"}), 201
+
+    @app.route("/users/<user_id>/items/search", methods=["GET"])
+    def buscar(user_id):
+        if request.args.get("seller_sku"):
+            resultados = por_sku.get(request.args["seller_sku"], [])
+            return jsonify({"results": resultados, "paging": {"total": len(resultados)}})
+
+        limite = int(request.args.get("limit", 50))
+        desde = int(request.args.get("scroll_id") or 0)
+        pagina = orden[desde:desde + limite]
+        return jsonify({"results": pagina, "scroll_id": str(desde + limite), "paging": {"total": len(orden)}})
+
+    @app.route("/sites/<site_id>/shipping/selfservice/items/<item_id>", methods=["GET", "POST", "DELETE"])
+    def selfservice(site_id, item_id):
+        with lock:
+            if request.method == "POST":
+                flex[item_id] = True
+            elif request.method == "DELETE":
+                flex[item_id] = False
+            activo = flex.get(item_id, False)
+        if request.method == "GET" and not activo:
+            return "", 404
+        return "", 204
+
+    @app.route("/oauth/token", methods=["POST"])
+    def oauth_token():
+        cuenta = request.form.get("client_id") or "cuenta"
+        token = f"BENCH-{cuenta}-{int(time.time() * 1000)}"
+        return jsonify({"access_token": token, "refresh_token": f"R{token}", "expires_in": 21600, "token_type": "Bearer"})
+
+    @app.route("/users/me", methods=["GET"])
+    def usuario():
+        return jsonify({"id": _id_usuario(_token_de(request)), "site_id": ML_SITE, "nickname": "BENCH"})
+
+    @app.route("/pictures/items/upload", methods=["POST"])
+    def subir_imagen():
+        archivo = request.files.get("file")
+        if archivo is None:
+            return jsonify({"message": "file is required"}), 400
+        picture_id = hashlib.sha1(archivo.read()).hexdigest()[:16]
+        return jsonify({"id": f"{picture_id}-F", "variations": []}), 201
+
+    return app
+
+
+# --- Shopify ---
+
+def _variante(indice, sku, con_imagenes=False):
+    nodo = {
+        "id": f"gid://shopify/ProductVariant/{40_000_000 + indice}",
+        "sku": sku,
+        "product": {"id": f"gid://shopify/Product/{30_000_000 + indice}"},
+        "inventoryItem": {"id": f"gid://shopify/InventoryItem/{50_000_000 + indice}"},
+    }
+    if con_imagenes:
+        nodo["product"]["title"] = f"Producto de prueba {indice}"
+        nodo["product"]["images"] = {"edges": [
+            {"node": {"originalSrc": f"https://{SHOPIFY_CDN_HOST}/s/files/bench/{sku}-{n}.jpg"}}
+            for n in range(IMAGENES_POR_SKU)
+        ]}
+    return nodo
+
+
+def crear_shopify(simulacion, skus):
+    """App que emula la API GraphQL/REST de la tienda y el CDN de imágenes."""
+    app = Flask("bench_shopify")
+    indices = {sku: i for i, sku in enumerate(skus)}
+
+    simulacion.instalar(app, "shopify", sin_fallas=("/s/files/<path:ruta>",))
+
+    def _costo(solicitado):
+        return {"cost": {
+            "requestedQueryCost": solicitado,
+            "actualQueryCost": solicitado,
+            "throttleStatus": {"maximumAvailable": 1000.0, "currentlyAvailable": 1000.0 - solicitado, "restoreRate": 50.0},
+        }}
+
+    @app.route("/admin/api/<version>/graphql.json", methods=["POST"])
+    def graphql(version):
+        payload = request.get_json(force=True)
+        consulta = payload.get("query", "")
+        variables = payload.get("variables") or {}
+
+        if "inventorySetQuantities" in consulta:
+            datos = {"inventorySetQuantities": {"inventoryAdjustmentGroup": {"id": "gid://shopify/InventoryAdjustmentGroup/1"}, "userErrors": []}}
+            return jsonify({"data": datos, "extensions": _costo(10)})
+
+        if "locations" in consulta:
+            datos = {"locations": {"edges": [{"node": {"id": "gid://shopify/Location/1", "name": "Bodega"}}]}}
+            return jsonify({"data": datos, "extensions": _costo(2)})
+
+        filtro = variables.get("query") or ""
+        if filtro.startswith("sku:"):
+            sku = filtro[len("sku:"):]
+            edges = [{"node": _variante(indices[sku], sku, con_imagenes=True)}] if sku in indices else []
+            datos = {"productVariants": {"pageInfo": {"hasNextPage": False, "endCursor": None}, "edges": edges}}
+            return jsonify({"data": datos, "extensions": _costo(12)})
+
+        # Recorrido paginado de todas las variantes
+        tamano = int(re.search(r"productVariants\(first:\s*(\d+)", consulta).group(1))
+        desde = int(variables.get("cursor") or 0)
+        pagina = skus[desde:desde + tamano]
+        datos = {"productVariants": {
+            "pageInfo": {"hasNextPage": desde + tamano < len(skus), "endCursor": str(desde + tamano)},
+            "edges": [{"node": _variante(indices[sku], sku)} for sku in pagina],
+        }}
+        return jsonify({"data": datos, "extensions": _costo(len(pagina) + 2)})
+
+    @app.route("/admin/api/<version>/inventory_levels/set.json", methods=["POST"])
+    def inventory_levels_set(version):
+        payload = request.get_json(force=True)
+        return jsonify({"inventory_level": {**payload, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}})
+
+    @app.route("/s/files/<path:ruta>", methods=["GET"])
+    def imagen(ruta):
+        contenido = hashlib.sha256(ruta.encode()).digest() * 256  # ~8 KB deterministas por imagen
+        return Response(contenido, mimetype="image/jpeg")
+
+    return app
+
+
+# --- Logi ---
+
+def crear_respuesta_logi(productos, seed=None):
+    """Respuesta de inventario de Logi con la forma de principal_graph.php, ya serializada."""
+    azar = random.Random(seed)
+    ubicaciones = [f"B{n:02d}-{m}" for n in range(20) for m in "ABCD"]
+    stock = []
+    for indice in range(productos):
+        codigo = f"770{azar.randrange(10 ** 10):010d}"
+        fecha = f"2024-{azar.randint(1, 12):02d}-{azar.randint(1, 28):02d} {azar.randint(0, 23):02d}:{azar.randint(0, 59):02d}:00"
+        stock.append({
+            "producto": [{
+                "pro_cod": codigo,
+                "pro_sku": sku_bench(indice),
+                "pro_desc": f"Producto de prueba {indice}",
+                "pro_ubicacion": azar.choice(ubicaciones),
+                "pro_fech_registro": fecha,
+            }],
+            "total_stock": [{"total_stock": str(azar.randint(0, 50))}],
+        })
+    return json.dumps({"data": {"stock": stock}}).encode("utf-8")
+
+
+def crear_logi(simulacion, productos, secreto, seed=None):
+    """App que emula principal_graph.php: token por app_secret_key e inventario con ese token."""
+    app = Flask("bench_logi")
+    inventario = crear_respuesta_logi(productos, seed)
+    emitidos = set()
+    lock = threading.Lock()
+
+    simulacion.instalar(app, "logi")
+
+    @app.route("/ApiLogi/principal_graph.php", methods=["POST"])
+    def principal_graph():
+        consulta = (request.get_json(force=True, silent=True) or {}).get("query", "")
+        if "app_secret_key" in consulta:
+            if f'secret_client:"{secreto}"' not in consulta:
+                return jsonify({"data": {"app_secret_key": []}})
+            token = f"LOGI-{int(time.time() * 1000)}"
+            with lock:
+                emitidos.add(token)
+            return jsonify({"data": {"app_secret_key": [{"suc_data": [{"token": token}]}]}})
+
+        with lock:
+            autorizado = request.headers.get("Authorization") in emitidos
+        if not autorizado:
+            return jsonify({"errors": [{"message": "Token inválido"}]}), 401
+        return Response(inventario, mimetype="application/json")
+
+    return app
+
+
+# --- Servidores ---
+
+class Servidor:
+    """Sirve una app WSGI en un puerto libre de 127.0.0.1 desde un hilo."""
+
+    def __init__(self, app):
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._hilo = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._server.shutdown()
@@ -0,0 +1,271 @@
+"""
+Benchmark del servicio contra dobles locales de MercadoLibre, Shopify y Logi.
+
+Levanta los dobles (bench/mocks.py), apunta el servicio a ellos con
+LANCH_UPSTREAM_OVERRIDES y ejecuta /update_stock, /stock y /clonar/<sku> con
+concurrencia, reportando req/s, latencia p50/p99 y llamadas upstream por operación.
+Todo el estado (config/tokens.json, bases SQLite) queda en un directorio temporal.
+
+Uso (desde la raíz del repositorio):
+    python -m bench.run --escenario todos --requests 200 --concurrencia 16 --latencia 0.05
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import mocks
+
+ESCENARIOS = ("update_stock", "stock", "clonar")
+CUENTAS = ("cuenta1", "cuenta2")
+LOGI_SECRETO = "bench-secret"
+
+_sesiones = threading.local()
+
+
+def _sesion():
+    if not hasattr(_sesiones, "session"):
+        _sesiones.session = requests.Session()
+    return _sesiones.session
+
+
+def _percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return None
+    return valores[min(len(valores) - 1, max(0, int(round(p / 100 * len(valores))) - 1))]
+
+
+def _medir(operacion, argumentos, concurrencia):
+    """
+    Ejecuta operacion(arg) para cada argumento con un pool de hilos.
+
+    :return: Diccionario con cantidad, errores, duración, req/s y latencias en ms.
+    """
+    latencias, errores = [], Counter()
+    lock = threading.Lock()
+
+    def _una(argumento):
+        inicio = time.perf_counter()
+        try:
+            error = operacion(argumento)
+        except requests.RequestException as e:
+            error = type(e).__name__
+        duracion = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracion)
+            if error:
+                errores[error] += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as executor:
+        list(executor.map(_una, argumentos))
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "requests": len(latencias),
+        "errors": sum(errores.values()),
+        "error_detail": dict(errores),
+        "seconds": round(total, 3),
+        "req_per_s": round(len(latencias) / total, 1) if total else None,
+        "p50_ms": round(_percentil(latencias, 50) * 1000, 1) if latencias else None,
+        "p99_ms": round(_percentil(latencias, 99) * 1000, 1) if latencias else None,
+    }
+
+
+def _llamadas_por_operacion(simulaciones, antes, cantidad):
+    despues = sum((simulacion.llamadas() for simulacion in simulaciones), Counter())
+    diferencia = despues - antes
+    return {clave: round(n / cantidad, 2) for clave, n in sorted(diferencia.items())} if cantidad else {}
+
+
+# --- Escenarios ---
+
+def escenario_update_stock(servicio, skus, args):
+    """POST /update_stock y espera a que la cola termine (la respuesta es solo el acuse)."""
+    job_queue = importlib.import_module("job_queue")
+    ml = importlib.import_module("ml")
+    azar = random.Random(args.seed)
+    pares = [(skus[i % len(skus)], azar.randint(0, 20)) for i in range(args.requests)]
+
+    def _enviar(par):
+        sku, stock = par
+        response = _sesion().post(f"{servicio}/update_stock", json={"sku": sku, "stock": stock})
+        return None if response.status_code == 200 else f"HTTP {response.status_code}"
+
+    inicio = time.perf_counter()
+    resultado = _medir(_enviar, pares, args.concurrencia)
+
+    # La cola coalesce por SKU: se espera a que no quede nada pendiente ni en curso
+    limite = time.monotonic() + args.espera_cola
+    while time.monotonic() < limite:
+        estados = job_queue.queue_stats(ml.UPDATE_STOCK_QUEUE)
+        if not estados.get("pending") and not estados.get("running"):
+            break
+        time.sleep(0.05)
+    total = time.perf_counter() - inicio
+
+    resultado["queue"] = {
+        "drained_seconds": round(total, 3),
+        "jobs_per_s": round(len(pares) / total, 1) if total else None,
+        "states": job_queue.queue_stats(ml.UPDATE_STOCK_QUEUE),
+    }
+    return resultado
+
+
+def escenario_stock(servicio, skus, args):
+    """GET /stock completo (con gzip, como un cliente normal)."""
+    def _pedir(_):
+        response = _sesion().get(f"{servicio}/stock")
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        if not response.headers.get("Content-Type", "").startswith("application/json"):
+            return response.text[:60]
+        return None
+
+    return _medir(_pedir, range(args.requests), args.concurrencia)
+
+
+def escenario_clonar(servicio, skus, args):
+    """GET /clonar/<sku> recorriendo los SKUs."""
+    def _clonar(sku):
+        response = _sesion().get(f"{servicio}/clonar/{sku}")
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        resultado = response.json().get("resultado")
+        return None if isinstance(resultado, dict) and resultado.get("id") else str(resultado)[:60]
+
+    return _medir(_clonar, [skus[i % len(skus)] for i in range(args.requests)], args.concurrencia)
+
+
+# --- Preparación ---
+
+def _escribir_tokens():
+    vencimiento = time.time() + 6 * 3600
+    tokens = {
+        cuenta: {"access_token": f"BENCH-{cuenta}-0", "refresh_token": f"R-{cuenta}", "expires_in": 21600, "expires_at": vencimiento}
+        for cuenta in CUENTAS
+    }
+    os.makedirs("config", exist_ok=True)
+    with open("config/tokens.json", "w") as file:
+        json.dump(tokens, file)
+
+
+def _configurar_entorno(dobles, args):
+    """Variables que deben estar definidas antes de importar los módulos del servicio."""
+    overrides = {
+        "api.mercadolibre.com": dobles["ml"].url,
+        mocks.SHOPIFY_HOST: dobles["shopify"].url,
+        mocks.SHOPIFY_CDN_HOST: dobles["shopify"].url,
+        "grupologi.com.co": dobles["logi"].url,
+    }
+    os.environ["LANCH_UPSTREAM_OVERRIDES"] = ",".join(f"{host}={url}" for host, url in overrides.items())
+    os.environ["SHOPIFY_STORE"] = mocks.SHOPIFY_HOST
+    os.environ["SHOPIFY_ACCESS_TOKEN"] = "bench-shopify-token"
+    os.environ["LOGI_SECRET_KEY"] = LOGI_SECRETO
+    os.environ["LOGI_STOCK_CACHE_TTL"] = str(args.stock_cache_ttl)
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--escenario", choices=(*ESCENARIOS, "todos"), default="todos")
+    parser.add_argument("--requests", type=int, default=200, help="Requests por escenario")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--skus", type=int, default=100, help="SKUs con publicaciones e imágenes")
+    parser.add_argument("--productos", type=int, default=5000, help="Productos en el inventario de Logi")
+    parser.add_argument("--latencia", type=float, default=0.02, help="Segundos de latencia de los dobles")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--tasa-429", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--retry-after", default="1", help="Retry-After de los 429")
+    parser.add_argument("--stock-cache-ttl", type=int, default=60, help="LOGI_STOCK_CACHE_TTL del servicio")
+    parser.add_argument("--espera-cola", type=float, default=120, help="Segundos máximos esperando la cola de /update_stock")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    parser.add_argument("--workdir", help="Directorio de estado (por defecto uno temporal)")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida del servicio")
+    return parser.parse_args(argv)
+
+
+def _imprimir(resultados):
+    print(f"{'operación':<14}{'n':>6}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for nombre, resultado in resultados.items():
+        print(
+            f"{nombre:<14}{resultado['requests']:>6}{resultado['errors']:>6}"
+            f"{resultado['req_per_s']:>9}{resultado['p50_ms']:>9}{resultado['p99_ms']:>9}"
+        )
+        if resultado["error_detail"]:
+            print(f"  errores: {resultado['error_detail']}")
+        if "queue" in resultado:
+            cola = resultado["queue"]
+            print(f"  cola: {cola['jobs_per_s']} trabajos/s, vacía en {cola['drained_seconds']} s, estados {cola['states']}")
+        print("  llamadas upstream por operación:")
+        for clave, promedio in resultado["upstream_calls_per_op"].items():
+            print(f"    {clave:<58}{promedio:>8}")
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    skus = [mocks.sku_bench(i) for i in range(args.skus)]
+    simulaciones = {
+        nombre: mocks.Simulacion(args.latencia, args.jitter, args.tasa_error, args.tasa_429, args.retry_after, args.seed)
+        for nombre in ("ml", "shopify", "logi")
+    }
+    dobles = {
+        "ml": mocks.Servidor(mocks.crear_mercadolibre(simulaciones["ml"], skus, args.seed)).iniciar(),
+        "shopify": mocks.Servidor(mocks.crear_shopify(simulaciones["shopify"], skus)).iniciar(),
+        "logi": mocks.Servidor(mocks.crear_logi(simulaciones["logi"], args.productos, LOGI_SECRETO, args.seed)).iniciar(),
+    }
+
+    # Los módulos del servicio usan rutas relativas (config/...): se trabaja en otro directorio
+    raiz = os.getcwd()
+    sys.path.insert(0, raiz)
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix="lanch-bench-"))
+    _configurar_entorno(dobles, args)
+    _escribir_tokens()
+
+    salida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with salida:
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        servicios = {
+            "update_stock": mocks.Servidor(importlib.import_module("ml").app).iniciar(),
+            "stock": mocks.Servidor(importlib.import_module("logi").app).iniciar(),
+            "clonar": mocks.Servidor(importlib.import_module("clone_listings").app).iniciar(),
+        }
+        funciones = {"update_stock": escenario_update_stock, "stock": escenario_stock, "clonar": escenario_clonar}
+
+        resultados = {}
+        for nombre in ESCENARIOS if args.escenario == "todos" else (args.escenario,):
+            antes = sum((simulacion.llamadas() for simulacion in simulaciones.values()), Counter())
+            resultado = funciones[nombre](servicios[nombre].url, skus, args)
+            resultado["upstream_calls_per_op"] = _llamadas_por_operacion(simulaciones.values(), antes, resultado["requests"])
+            resultados[nombre] = resultado
+
+    logging.disable(logging.NOTSET)
+    _imprimir(resultados)
+    if args.json:
+        ruta = args.json if os.path.isabs(args.json) else os.path.join(raiz, args.json)
+        with open(ruta, "w") as file:
+            json.dump({"args": vars(args), "results": resultados}, file, indent=2)
+        print(f"Resultados guardados en {ruta}")
+
+    for servidor in [*servicios.values(), *dobles.values()]:
+        servidor.detener()
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Máximo de SKUs procesándose al mismo tiempo en /update_stock/bulk
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", "8"))
+BULK_FANOUT_BUFFER = int(os.getenv("BULK_FANOUT_BUFFER", "64"))  # Pares leídos por adelantado por consumidor
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def parse_stock_pairs(flask_request):
+    """
+    Lee los pares {sku, stock} del cuerpo de la petición.
+
+    Acepta un arreglo JSON o un stream NDJSON (un objeto por línea). El NDJSON se
+    lee de forma perezosa para poder empezar a procesar antes de recibirlo completo.
+    """
+    if flask_request.mimetype in NDJSON_MIMETYPES:
+        return _iter_ndjson(flask_request.stream)
+
+    data = flask_request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Se esperaba un arreglo JSON o NDJSON de pares {sku, stock}")
+    return iter(data)
+
+
+def _iter_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # Se reporta como par inválido sin cortar el resto del stream
+
+
+def validate_pair(pair):
+    """
+    Valida un par {sku, stock}.
+
+    :return: Tupla (sku, stock, error); error es el resultado a reportar si el par es inválido.
+    """
+    sku = pair.get("sku") if isinstance(pair, dict) else None
+    stock = pair.get("stock") if isinstance(pair, dict) else None
+
+    if not sku or stock is None:
+        return sku, stock, {"sku": sku, "stock": stock, "status": "error", "error": "Missing SKU or stock"}
+    return sku, stock, None
+
+
+def run_bulk(process_pair, pairs, max_workers=BULK_MAX_WORKERS):
+    """
+    Procesa los pares con concurrencia acotada.
+
+    :param process_pair: Función (sku, stock) -> dict con el resultado del SKU.
+    :param pairs: Iterable de diccionarios {sku, stock}.
+    :param max_workers: Máximo de SKUs en paralelo.
+    :return: Lista de resultados en el mismo orden de entrada.
+    """
+    results = []
+    pending = {}
+
+    def _collect(done):
+        for future in done:
+            index, sku, stock = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = {"sku": sku, "stock": stock, "status": "error", "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for pair in pairs:
+            index = len(results)
+            sku, stock, error = validate_pair(pair)
+            if error:
+                results.append(error)
+                continue
+
+            results.append(None)
+            pending[executor.submit(process_pair, sku, stock)] = (index, sku, stock)
+
+            # Se limita lo que está en vuelo para no acumular todo el stream en memoria
+            if len(pending) >= max_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+
+        if pending:
+            done, _ = wait(pending)
+            _collect(done)
+
+    return results
+
+
+def summarize(results):
+    """Cuenta los resultados por estado para la respuesta del endpoint."""
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
+
+# --- Reparto a varios consumidores ---
+# Cada cuenta de MercadoLibre recorre los mismos pares. En lugar de leer todo el
+# cuerpo antes de empezar, un hilo lee el stream y lo reparte a una cola acotada por
+# consumidor: el más lento marca el ritmo y en memoria hay a lo sumo
+# BULK_FANOUT_BUFFER pares por consumidor.
+
+_END = object()
+
+
+class PairFanout:
+    """
+    Reparte un iterable de pares a varios consumidores sin materializarlo.
+
+    Uso: feed(nombre) devuelve el iterador de cada consumidor; close(nombre) lo
+    libera (se debe llamar aunque el consumidor falle o no llegue a empezar, para
+    no frenar a los demás).
+    """
+
+    def __init__(self, pairs, names, max_buffered=BULK_FANOUT_BUFFER):
+        self._pairs = pairs
+        self._queues = {name: queue.Queue(max_buffered) for name in names}
+        self._closed = {name: threading.Event() for name in names}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(self, name, item):
+        while not self._closed[name].is_set():
+            try:
+                self._queues[name].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        try:
+            for pair in self._pairs:
+                if all(closed.is_set() for closed in self._closed.values()):
+                    return
+                for name in self._queues:
+                    self._put(name, pair)
+            end = _END
+        except Exception as e:  # Error al leer el stream: cada consumidor lo recibe
+            end = e
+        for name in self._queues:
+            self._put(name, end)
+
+    def feed(self, name):
+        """Iterador de los pares para un consumidor."""
+        pending = self._queues[name]
+        while True:
+            item = pending.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self, name):
+        """Marca que un consumidor terminó; sus pares pendientes se descartan."""
+        self._closed[name].set()
+        pending = self._queues[name]
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                return
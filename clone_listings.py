@@ -1,69 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+import http_client
+import metrics
 import json
 from shopi import get_url_pics_sku
 from flask import Flask, request, jsonify
-from auth import load_tokens, get_user_info
+from bulk import summarize
+from auth import load_tokens, get_access_token, get_user_info
 from ml import get_traditional_listings
+from ml_pictures import get_picture_ids
 
 app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
+
+# --- Configuración del clonado en lote ---
+# Cada etapa tiene su propio pool: mientras unos SKUs se publican, otros se siguen
+# buscando en la cuenta 1 y otros resolviendo imágenes en Shopify.
+CLONE_SOURCE_WORKERS = int(os.getenv("CLONE_SOURCE_WORKERS", "4"))
+CLONE_IMAGE_WORKERS = int(os.getenv("CLONE_IMAGE_WORKERS", "4"))
+CLONE_PUBLISH_WORKERS = int(os.getenv("CLONE_PUBLISH_WORKERS", "2"))
+CLONE_DUMP_DIR = os.getenv("CLONE_DUMP_DIR", ".")
+
+
+class ClonError(Exception):
+    """Error esperado al clonar un SKU; el mensaje es el resultado que se reporta."""
+
+    def __init__(self, mensaje, status="error"):
+        super().__init__(mensaje)
+        self.status = status
+
 
 def obtener_datos_publicacion(ml_item_id, access_token):
     print("Obteniendo datos de la publicación...")
-    url = f"https://api.mercadolibre.com/items/{ml_item_id}?include_attributes=all&access_token={access_token}"
-    response = requests.get(url)
+    url = f"https://api.mercadolibre.com/items/{ml_item_id}?include_attributes=all"
+    response = http_client.get(url, token=access_token, account="cuenta1")
     return response.json() if response.status_code == 200 else None
-def clonar_publicacion(sku, access_token_cuenta1, access_token_cuenta2):
-    try:
-        user_id = get_user_info('cuenta1')['id']
-        search_url = f"https://api.mercadolibre.com/users/{user_id}/items/search?seller_sku={sku}&access_token={access_token_cuenta1}"
-        search_response = requests.get(search_url).json()
-
-        if not search_response.get("results"):
-            return f"No se encontró ninguna publicación con SKU: {sku}"
-
-        results = search_response["results"]
-        item_id = get_traditional_listings(access_token_cuenta1, results)[0]
-        # 2. Obtener detalles del producto original
-        datos_originales = obtener_datos_publicacion(item_id, access_token_cuenta1)
-        if not datos_originales:
-            return "Error al obtener los datos del producto."
-        
-        with open("original.json", "w", encoding="utf-8") as file:
-            json.dump(datos_originales, file, indent=4, ensure_ascii=False)  # `indent=4` para que sea legible
 
-        print("JSON exportado correctamente a 'original.json'")
 
-        # 3. Obtener imágenes desde Shopify (función ya existente)
-        imagenes_sku = get_url_pics_sku(sku)
-        if not imagenes_sku:
-            return "Error al obtener las imágenes del SKU."
-        # 4. Crear el nuevo payload (excluyendo imágenes originales y seller_id)
-    
-        nuevo_payload = {
-            "title": datos_originales["title"],
-            "category_id": datos_originales["category_id"],
-            "price": datos_originales["price"],
-            "currency_id": datos_originales["currency_id"],
-            "available_quantity": datos_originales["available_quantity"],
-            "buying_mode": datos_originales["buying_mode"],
-            "condition": datos_originales["condition"],
-            "listing_type_id": datos_originales["listing_type_id"],
-            "sale_terms": [
-                {"id": term["id"], "value_name": term["value_name"]}
-                for term in datos_originales.get("sale_terms", [])
-                if term["id"] in ["WARRANTY_TYPE", "WARRANTY_TIME"]
-            ],
-            "pictures": [{"source": img} for img in imagenes_sku],
-            "shipping": {
-                "mode": datos_originales.get("shipping", {}).get("mode", "me2"),  # Valor por defecto "me2"
-                "tags": datos_originales.get("shipping", {}).get("tags", [])  # Extrae los tags o lista vacía si no existe
-            },
-            "attributes": [
-                {"id": attr["id"], "value_name": attr["value_name"]}
-                for attr in datos_originales.get("attributes", [])  # 🔥 Asegura que `attributes` exista
-                if attr.get("value_name") is not None  # 🔍 Filtra solo los que tienen `value_name`
-            ],
-            "variations": [
+def _volcar(nombre, datos):
+    """Guarda un JSON legible en CLONE_DUMP_DIR (solo si se pidió volcar a disco)."""
+    os.makedirs(CLONE_DUMP_DIR, exist_ok=True)
+    ruta = os.path.join(CLONE_DUMP_DIR, nombre)
+    with open(ruta, "w", encoding="utf-8") as file:
+        json.dump(datos, file, indent=4, ensure_ascii=False)  # `indent=4` para que sea legible
+    print(f"JSON exportado correctamente a '{ruta}'")
+
+
+def buscar_origen(sku, access_token_cuenta1, user_id):
+    """Etapa 1: busca la publicación tradicional del SKU en la cuenta 1 y trae sus datos."""
+    search_url = f"https://api.mercadolibre.com/users/{user_id}/items/search?seller_sku={sku}"
+    search_response = http_client.get(search_url, token=access_token_cuenta1, account="cuenta1").json()
+
+    if not search_response.get("results"):
+        raise ClonError(f"No se encontró ninguna publicación con SKU: {sku}", "not_found")
+
+    tradicionales = get_traditional_listings(access_token_cuenta1, search_response["results"], account="cuenta1")
+    if not tradicionales:
+        raise ClonError(f"No hay publicaciones tradicionales con SKU: {sku}", "not_found")
+
+    # 2. Obtener detalles del producto original
+    datos_originales = obtener_datos_publicacion(tradicionales[0], access_token_cuenta1)
+    if not datos_originales:
+        raise ClonError("Error al obtener los datos del producto.")
+    return datos_originales
+
+
+def resolver_imagenes(sku, access_token_cuenta2=None):
+    """
+    Etapa 2: obtiene las imágenes del SKU desde Shopify.
+
+    Con el token de la cuenta 2 además las sube (una sola vez por imagen, ver ml_pictures).
+
+    :return: Tupla (URLs, picture IDs); los IDs son None si no se subieron.
+    """
+    imagenes_sku = get_url_pics_sku(sku)
+    if not isinstance(imagenes_sku, list):  # {"error": ...} si el SKU no está en Shopify
+        raise ClonError(f"SKU {sku} no encontrado en Shopify.", "not_found")
+    if not imagenes_sku:
+        raise ClonError("Error al obtener las imágenes del SKU.")
+    if not access_token_cuenta2:
+        return imagenes_sku, [None] * len(imagenes_sku)
+    return imagenes_sku, get_picture_ids(access_token_cuenta2, "cuenta2", imagenes_sku)
+
+
+def construir_payload(datos_originales, imagenes_sku, picture_ids=None):
+    """
+    Etapa 3: arma el payload de la nueva publicación (sin imágenes originales ni seller_id).
+
+    Las imágenes con picture ID se referencian por ID; el resto por URL.
+    """
+    picture_ids = picture_ids or [None] * len(imagenes_sku)
+    return {
+        "title": datos_originales["title"],
+        "category_id": datos_originales["category_id"],
+        "price": datos_originales["price"],
+        "currency_id": datos_originales["currency_id"],
+        "available_quantity": datos_originales["available_quantity"],
+        "buying_mode": datos_originales["buying_mode"],
+        "condition": datos_originales["condition"],
+        "listing_type_id": datos_originales["listing_type_id"],
+        "sale_terms": [
+            {"id": term["id"], "value_name": term["value_name"]}
+            for term in datos_originales.get("sale_terms", [])
+            if term["id"] in ["WARRANTY_TYPE", "WARRANTY_TIME"]
+        ],
+        "pictures": [
+            {"id": picture_id} if picture_id else {"source": img}
+            for img, picture_id in zip(imagenes_sku, picture_ids)
+        ],
+        "shipping": {
+            "mode": datos_originales.get("shipping", {}).get("mode", "me2"),  # Valor por defecto "me2"
+            "tags": datos_originales.get("shipping", {}).get("tags", [])  # Extrae los tags o lista vacía si no existe
+        },
+        "attributes": [
+            {"id": attr["id"], "value_name": attr["value_name"]}
+            for attr in datos_originales.get("attributes", [])  # 🔥 Asegura que `attributes` exista
+            if attr.get("value_name") is not None  # 🔍 Filtra solo los que tienen `value_name`
+        ],
+        "variations": [
             {
                 "price": var["price"],
                 "attribute_combinations": [
@@ -71,31 +127,123 @@ def clonar_publicacion(sku, access_token_cuenta1, access_token_cuenta2):
                     if attr["name"] != "Compatibilidad" or attr.get("value_name")
                 ],
                 "available_quantity": var["available_quantity"],
-                "picture_ids": imagenes_sku,
+                "picture_ids": [picture_id or img for img, picture_id in zip(imagenes_sku, picture_ids)],
                 "attributes": var["attributes"]
             }
             for var in datos_originales["variations"]
         ]
-        }
+    }
+
 
-        with open("publicacion.json", "w", encoding="utf-8") as file:
-            json.dump(nuevo_payload, file, indent=4, ensure_ascii=False)  # `indent=4` para que sea legible
+def publicar(nuevo_payload, access_token_cuenta2):
+    """Etapa 4: publica en la cuenta 2. Devuelve la publicación creada."""
+    url_publicar = f"https://api.mercadolibre.com/items"
+    response = http_client.post(url_publicar, json=nuevo_payload, token=access_token_cuenta2, account="cuenta2")
+    if response.status_code != 201:
+        raise ClonError(f"Error: {response.text}")
+    return response.json()
 
-        print("JSON exportado correctamente a 'publicacion.json'")
 
+def clonar_publicacion(sku, access_token_cuenta1, access_token_cuenta2, user_id=None, volcar=False):
+    """
+    Clona la publicación tradicional de un SKU de la cuenta 1 en la cuenta 2.
+
+    :param user_id: ID de la cuenta 1; si no se pasa, se consulta.
+    :param volcar: Si es True, guarda original.json y publicacion.json en CLONE_DUMP_DIR.
+    :return: La publicación creada o un mensaje de error.
+    """
+    try:
+        user_id = user_id or get_user_info('cuenta1')['id']
+        datos_originales = buscar_origen(sku, access_token_cuenta1, user_id)
+        if volcar:
+            _volcar("original.json", datos_originales)
+
+        # 3. Obtener imágenes desde Shopify (función ya existente)
+        imagenes_sku, picture_ids = resolver_imagenes(sku, access_token_cuenta2)
+        nuevo_payload = construir_payload(datos_originales, imagenes_sku, picture_ids)
+        if volcar:
+            _volcar("publicacion.json", nuevo_payload)
 
         # 5. Publicar en la cuenta 2
-        url_publicar = f"https://api.mercadolibre.com/items"
-        headers = {"Authorization": f"Bearer {access_token_cuenta2}","Content-Type": "application/json"}
-        response = requests.post(url_publicar, json=nuevo_payload, headers=headers)
-        #response.raise_for_status()  # Lanza una excepción si hay un error HTTP
-        return response.json() if response.status_code == 201 else f"Error: {response.text}"
+        return publicar(nuevo_payload, access_token_cuenta2)
 
+    except ClonError as e:
+        return str(e)
     except requests.exceptions.RequestException as e:
         return f"Error al clonar publicación: {e}"
     except Exception as e:
         return f"Error inesperado al clonar publicación: {e}"
-    
+
+
+def _resultado_error(sku, etapa, error):
+    if isinstance(error, ClonError):
+        return {"sku": sku, "status": error.status, "stage": etapa, "error": str(error)}
+    if isinstance(error, requests.exceptions.RequestException):
+        return {"sku": sku, "status": "error", "stage": etapa, "error": f"Error al clonar publicación: {error}"}
+    return {"sku": sku, "status": "error", "stage": etapa, "error": f"Error inesperado al clonar publicación: {error}"}
+
+
+def clonar_lote(skus, access_token_cuenta1, access_token_cuenta2, volcar=False):
+    """
+    Clona varios SKUs como un pipeline concurrente.
+
+    La búsqueda en la cuenta 1 y las imágenes de Shopify de cada SKU se piden en
+    paralelo; apenas están las dos se arma el payload y se encola la publicación.
+    El user_id de la cuenta 1 se consulta una sola vez por lote.
+
+    :param skus: Lista de SKUs (los repetidos se clonan una vez).
+    :param volcar: Si es True, guarda original_<sku>.json y publicacion_<sku>.json en CLONE_DUMP_DIR.
+    :return: Lista de resultados por SKU, en el orden recibido.
+    """
+    skus = list(dict.fromkeys(skus))
+    user_id = get_user_info('cuenta1')['id']
+    resultados = {}
+
+    with ThreadPoolExecutor(CLONE_SOURCE_WORKERS) as origenes, \
+            ThreadPoolExecutor(CLONE_IMAGE_WORKERS) as imagenes, \
+            ThreadPoolExecutor(CLONE_PUBLISH_WORKERS) as publicaciones:
+        etapas = {}
+        for sku in skus:
+            etapas[origenes.submit(buscar_origen, sku, access_token_cuenta1, user_id)] = (sku, "source")
+            etapas[imagenes.submit(resolver_imagenes, sku, access_token_cuenta2)] = (sku, "images")
+
+        listos = {}
+        envios = {}
+        for future in as_completed(etapas):
+            sku, etapa = etapas[future]
+            if sku in resultados:
+                continue  # La otra etapa del SKU ya falló
+            try:
+                listos.setdefault(sku, {})[etapa] = future.result()
+            except Exception as e:
+                resultados[sku] = _resultado_error(sku, etapa, e)
+                continue
+            if len(listos[sku]) < 2:
+                continue
+
+            datos = listos.pop(sku)
+            try:
+                nuevo_payload = construir_payload(datos["source"], *datos["images"])
+            except Exception as e:
+                resultados[sku] = _resultado_error(sku, "build", e)
+                continue
+            if volcar:
+                nombre = sku.replace(os.sep, "_")
+                _volcar(f"original_{nombre}.json", datos["source"])
+                _volcar(f"publicacion_{nombre}.json", nuevo_payload)
+            envios[publicaciones.submit(publicar, nuevo_payload, access_token_cuenta2)] = sku
+
+        for future in as_completed(envios):
+            sku = envios[future]
+            try:
+                publicacion = future.result()
+                resultados[sku] = {"sku": sku, "status": "published", "item_id": publicacion.get("id")}
+            except Exception as e:
+                resultados[sku] = _resultado_error(sku, "publish", e)
+
+    return [resultados[sku] for sku in skus]
+
+
 @app.route("/clonar/<sku>", methods=["GET"])
 def clonar_producto(sku):
     try:
@@ -105,13 +253,38 @@ def clonar_producto(sku):
         if "cuenta1" not in tokens or "cuenta2" not in tokens:
             return jsonify({"error": "No se encontraron tokens para ambas cuentas."}), 400
 
-        access_token_cuenta1 = tokens["cuenta1"]["access_token"]
-        access_token_cuenta2 = tokens["cuenta2"]["access_token"]
-        resultado = clonar_publicacion(sku, access_token_cuenta1, access_token_cuenta2)
+        access_token_cuenta1 = get_access_token("cuenta1")
+        access_token_cuenta2 = get_access_token("cuenta2")
+        volcar = request.args.get("dump") in ("1", "true")
+        resultado = clonar_publicacion(sku, access_token_cuenta1, access_token_cuenta2, volcar=volcar)
         return jsonify({"resultado": resultado})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/clonar", methods=["POST"])
+def clonar_productos():
+    """
+    Clona varios SKUs en paralelo.
+
+    Cuerpo: {"skus": ["SKU1", "SKU2"], "dump": false} o directamente la lista de SKUs.
+    """
+    data = request.get_json(silent=True)
+    skus = data.get("skus") if isinstance(data, dict) else data
+    if not isinstance(skus, list) or not all(isinstance(sku, str) and sku for sku in skus):
+        return jsonify({"error": "Se esperaba una lista de SKUs."}), 400
+
+    try:
+        tokens = load_tokens()
+        if "cuenta1" not in tokens or "cuenta2" not in tokens:
+            return jsonify({"error": "No se encontraron tokens para ambas cuentas."}), 400
+
+        volcar = bool(data.get("dump")) if isinstance(data, dict) else False
+        results = clonar_lote(skus, get_access_token("cuenta1"), get_access_token("cuenta2"), volcar=volcar)
+        return jsonify({"summary": summarize(results), "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
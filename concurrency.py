@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rate_limit
+
+# --- Configuración ---
+# UPSTREAM_MAX_WORKERS: hilos compartidos para llamadas a APIs externas.
+# UPSTREAM_HOST_CONCURRENCY: llamadas simultáneas por host (por defecto). En los hosts
+#   con límite de tasa por cuenta (rate_limit.RATE_LIMITED_HOSTS) el cupo es por host y
+#   cuenta, así sumar cuentas no reparte el mismo cupo entre más llamadas.
+# UPSTREAM_HOST_LIMITS: límites específicos, ej. "api.mercadolibre.com=8,grupologi.com.co=2".
+# UPSTREAM_ACCOUNT_CONCURRENCY: llamadas simultáneas por cuenta.
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "32"))
+UPSTREAM_HOST_CONCURRENCY = int(os.getenv("UPSTREAM_HOST_CONCURRENCY", "8"))
+UPSTREAM_ACCOUNT_CONCURRENCY = int(os.getenv("UPSTREAM_ACCOUNT_CONCURRENCY", "4"))
+
+
+def _parse_limits(value):
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        host, _, limit = entry.partition("=")
+        limits[host.strip()] = int(limit)
+    return limits
+
+
+HOST_LIMITS = _parse_limits(os.getenv("UPSTREAM_HOST_LIMITS", ""))
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix="upstream")
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _semaphore(kind, key, limit):
+    with _semaphores_lock:
+        if (kind, key) not in _semaphores:
+            _semaphores[(kind, key)] = threading.BoundedSemaphore(limit)
+        return _semaphores[(kind, key)]
+
+
+def _run_limited(func, item, host, account):
+    host_key = (host, account) if account and host in rate_limit.RATE_LIMITED_HOSTS else host
+    host_slot = _semaphore("host", host_key, HOST_LIMITS.get(host, UPSTREAM_HOST_CONCURRENCY))
+    account_slot = _semaphore("account", account, UPSTREAM_ACCOUNT_CONCURRENCY) if account else None
+
+    with host_slot:
+        if account_slot is None:
+            return func(item)
+        with account_slot:
+            return func(item)
+
+
+def map_ordered(func, items, host, account=None):
+    """
+    Ejecuta func(item) para cada item en paralelo respetando los límites por host y cuenta.
+
+    Cada llamada a func es una unidad: si un item requiere varios pasos en orden
+    (ej. consultar Flex antes de cambiarlo), deben ir dentro de la misma función.
+
+    :param func: Función que recibe un item y hace las llamadas externas.
+    :param items: Items a procesar.
+    :param host: Host al que se dirigen las llamadas (para el límite por host).
+    :param account: Cuenta dueña de las llamadas (clave de CREDENTIALS), opcional.
+    :return: Lista de resultados en el mismo orden que items. Si alguna llamada
+             falla, se espera a que terminen todas y se relanza el primer error
+             según el orden de entrada.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [_run_limited(func, item, host, account) for item in items]
+
+    futures = [_executor.submit(_run_limited, func, item, host, account) for item in items]
+
+    results = []
+    first_error = None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(None)
+            if first_error is None:
+                first_error = e
+
+    if first_error is not None:
+        raise first_error
+    return results
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import rate_limit
+
+# --- Configuración ---
+# HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT: segundos antes de abortar una llamada.
+# HTTP_POOL_SIZE: conexiones keep-alive por host (por defecto).
+# HTTP_POOL_SIZES: tamaños específicos, ej. "api.mercadolibre.com=32,grupologi.com.co=4".
+# LANCH_UPSTREAM_OVERRIDES: redirige hosts a otra base URL, ej.
+#   "api.mercadolibre.com=http://127.0.0.1:9001" (para benchmarks y pruebas locales).
+#   Sesiones, encabezados y límites siguen siendo los del host original.
+HTTP_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+
+def _parse_sizes(value):
+    sizes = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        host, _, size = entry.partition("=")
+        sizes[host.strip()] = int(size)
+    return sizes
+
+
+def _parse_overrides(value):
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        host, _, base = entry.partition("=")
+        overrides[host.strip().lower()] = base.strip()
+    return overrides
+
+
+POOL_SIZES = _parse_sizes(os.getenv("HTTP_POOL_SIZES", ""))
+UPSTREAM_OVERRIDES = _parse_overrides(os.getenv("LANCH_UPSTREAM_OVERRIDES", ""))
+
+
+def _override_url(url, host):
+    """Aplica LANCH_UPSTREAM_OVERRIDES: cambia esquema y host, conserva ruta y query."""
+    base = UPSTREAM_OVERRIDES.get((host or "").lower())
+    if not base:
+        return url
+    parts, target = urlsplit(url), urlsplit(base)
+    return urlunsplit((target.scheme, target.netloc, target.path.rstrip("/") + parts.path, parts.query, parts.fragment))
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host):
+    """Devuelve la sesión compartida (pool de conexiones keep-alive) de un host."""
+    host = (host or "").lower()
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = POOL_SIZES.get(host, HTTP_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def set_default_headers(host, headers):
+    """Registra encabezados (ej. autenticación) que se envían en todas las llamadas a un host."""
+    get_session(host).headers.update(headers)
+
+
+def request(method, url, token=None, account=None, **kwargs):
+    """
+    Hace una llamada HTTP usando la sesión compartida del host.
+
+    Las llamadas a MercadoLibre pasan por el limitador de la cuenta (rate_limit).
+
+    :param method: Método HTTP.
+    :param url: URL completa.
+    :param token: Token Bearer opcional (se envía en el encabezado Authorization).
+    :param account: Cuenta dueña de la llamada (clave de CREDENTIALS), para el límite de tasa.
+    :return: requests.Response
+    """
+    host = urlsplit(url).hostname
+    headers = dict(kwargs.pop("headers", None) or {})
+    if token:
+        headers.setdefault("Authorization", f"Bearer {token}")
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+
+    session = get_session(host)
+    path = urlsplit(url).path
+    url = _override_url(url, host)
+
+    def send():
+        # Cada intento se mide por separado (los 429 reintentados también cuentan)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, headers=headers, **kwargs)
+        except requests.RequestException:
+            metrics.record_upstream(host, path, account, "error", time.perf_counter() - started)
+            raise
+        metrics.record_upstream(host, path, account, response.status_code, time.perf_counter() - started)
+        return response
+
+    if host in rate_limit.RATE_LIMITED_HOSTS:
+        return rate_limit.call(account or "default", send)
+    return send()
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,243 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from barcodes import validar_codigos_barras
+
+# --- Inventario por columnas ---
+# Guarda un snapshot de Logi como columnas en lugar de un diccionario por producto:
+# stock, códigos y fechas en arreglos de NumPy y las ubicaciones (muy repetidas) como
+# índices a una lista de valores únicos. Las fechas se interpretan en lote y los
+# productos se siguen pudiendo recorrer como diccionarios con las mismas claves que
+# devolvía decode_and_format.
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+BLOQUE_EXPORTACION = 4096  # Filas que se convierten a objetos de Python por vez al recorrer
+
+_EPOCA = datetime(1970, 1, 1)
+_SEPARADORES = {4: ord("-"), 7: ord("-"), 10: ord(" "), 13: ord(":"), 16: ord(":")}
+_POSICIONES_DIGITOS = [i for i in range(19) if i not in _SEPARADORES]
+
+
+def _campos_fecha(digitos, desde, hasta):
+    """Convierte las columnas [desde, hasta) de una matriz de dígitos en un número por fila."""
+    valor = np.zeros(digitos.shape[0], dtype=np.int64)
+    for i in range(desde, hasta):
+        valor = valor * 10 + digitos[:, i]
+    return valor
+
+
+def _parsear_fechas_rapido(fechas):
+    """
+    Interpreta en lote las fechas con el formato exacto AAAA-MM-DD HH:MM:SS.
+
+    :return: Tupla (timestamps, máscara de filas interpretadas); el resto debe ir por strptime.
+    """
+    resultado = np.full(len(fechas), np.nan)
+    candidatas = [i for i, fecha in enumerate(fechas) if len(fecha) == 19 and fecha.isascii()]
+    if not candidatas:
+        return resultado, np.zeros(len(fechas), dtype=bool)
+
+    crudo = np.frombuffer("".join(fechas[i] for i in candidatas).encode("ascii"), dtype=np.uint8)
+    crudo = crudo.reshape(len(candidatas), 19).astype(np.int64)
+    digitos = crudo - ord("0")
+
+    formato_ok = np.ones(len(candidatas), dtype=bool)
+    for posicion, separador in _SEPARADORES.items():
+        formato_ok &= crudo[:, posicion] == separador
+    formato_ok &= ((digitos[:, _POSICIONES_DIGITOS] >= 0) & (digitos[:, _POSICIONES_DIGITOS] <= 9)).all(axis=1)
+
+    anio = _campos_fecha(digitos, 0, 4)
+    mes = _campos_fecha(digitos, 5, 7)
+    dia = _campos_fecha(digitos, 8, 10)
+    hora = _campos_fecha(digitos, 11, 13)
+    minuto = _campos_fecha(digitos, 14, 16)
+    segundo = _campos_fecha(digitos, 17, 19)
+
+    # Años acotados para que el cálculo de la zona horaria sea el mismo que hace datetime
+    ok = formato_ok & (anio >= 1971) & (anio <= 2999) & (mes >= 1) & (mes <= 12)
+    ok &= (hora <= 23) & (minuto <= 59) & (segundo <= 59) & (dia >= 1)
+    meses = np.where(ok, (anio - 1970) * 12 + mes - 1, 0).astype("datetime64[M]")
+    dias_del_mes = ((meses + 1).astype("datetime64[D]") - meses.astype("datetime64[D]")).astype(np.int64)
+    ok &= dia <= dias_del_mes
+
+    ingenuo = (meses.astype("datetime64[D]").astype(np.int64) + dia - 1) * 86400 + hora * 3600 + minuto * 60 + segundo
+
+    # strptime().timestamp() interpreta la fecha en la zona horaria local: se calcula
+    # el desfase una vez por cada hora distinta, al principio y al final de la hora. Si
+    # no coinciden (cambios de horario que no caen en hora entera, como los de 30
+    # minutos de Australia/Lord_Howe), las filas de esa hora van por strptime.
+    horas = ingenuo[ok] // 3600
+    unicas, inversas = np.unique(horas, return_inverse=True)
+    inversas = inversas.reshape(-1)
+    desfases = np.array(
+        [(_EPOCA + timedelta(hours=h)).timestamp() - h * 3600 for h in unicas.tolist()], dtype=np.float64
+    )
+    desfases_fin = np.array(
+        [(_EPOCA + timedelta(seconds=h * 3600 + 3599)).timestamp() - (h * 3600 + 3599) for h in unicas.tolist()],
+        dtype=np.float64,
+    )
+    hora_uniforme = (desfases == desfases_fin)[inversas]
+
+    indices = np.asarray(candidatas)[ok][hora_uniforme]
+    resultado[indices] = ingenuo[ok][hora_uniforme] + desfases[inversas[hora_uniforme]]
+    interpretadas = np.zeros(len(fechas), dtype=bool)
+    interpretadas[indices] = True
+    return resultado, interpretadas
+
+
+def parsear_fechas(fechas):
+    """
+    Convierte fechas 'AAAA-MM-DD HH:MM:SS' (hora local) en timestamps.
+
+    Da el mismo resultado que datetime.strptime(fecha, FORMATO_FECHA).timestamp().
+
+    :param fechas: Lista de strings.
+    :return: Arreglo float64; NaN donde la fecha no es válida.
+    """
+    resultado, interpretadas = _parsear_fechas_rapido(fechas)
+    for i in np.flatnonzero(~interpretadas).tolist():
+        try:
+            resultado[i] = datetime.strptime(fechas[i], FORMATO_FECHA).timestamp()
+        except ValueError:
+            logging.warning(f"Fecha inválida: {fechas[i]}")
+    return resultado
+
+
+def _columna_enteros(valores):
+    """Arreglo int64 con máscara de nulos; object si algún valor no entra en 64 bits."""
+    presentes = np.array([valor is not None for valor in valores], dtype=bool)
+    try:
+        columna = np.array([0 if valor is None else valor for valor in valores], dtype=np.int64)
+    except OverflowError:
+        columna = np.array(valores, dtype=object)
+    return columna, presentes
+
+
+class Inventario:
+    """
+    Snapshot del inventario de Logi guardado por columnas.
+
+    Se recorre como una lista de diccionarios (mismas claves y valores que
+    decode_and_format) y permite buscar por pro_sku o pro_cod.
+    """
+
+    def __init__(self, pro_cod, pro_cod_int, pro_sku, pro_desc, pro_ubicacion, fechas, total_stock):
+        self.pro_cod = pro_cod
+        self.pro_cod_int, self._tiene_cod_int = _columna_enteros(pro_cod_int)
+        self.pro_cod_valido = np.zeros(len(pro_cod), dtype=bool)
+        indices_numericos = np.flatnonzero(self._tiene_cod_int)
+        self.pro_cod_valido[indices_numericos] = validar_codigos_barras([pro_cod[i] for i in indices_numericos.tolist()])
+        self.pro_sku = pro_sku
+        self.pro_desc = pro_desc
+
+        # Ubicaciones como categorías: índice por producto y lista de valores únicos
+        posiciones = {}
+        self.ubicacion = np.array(
+            [posiciones.setdefault(ubicacion, len(posiciones)) for ubicacion in pro_ubicacion], dtype=np.int32
+        )
+        self.ubicaciones = list(posiciones)
+
+        self.pro_fech_registro = parsear_fechas(fechas)
+        self.total_stock = np.array(total_stock, dtype=np.int64)
+        self._indice_sku = None
+        self._indice_cod = None
+
+    @classmethod
+    def desde_respuesta(cls, data):
+        """
+        Arma el inventario a partir de la respuesta cruda de obtener_inventario (ya validada).
+
+        Los productos con datos que no se pueden convertir se registran y se omiten.
+        """
+        columnas = ([], [], [], [], [], [], [])
+        for stock_item in data["data"]["stock"]:
+            total_stock_list = stock_item.get("total_stock", [])
+            total_stock, error_stock = 0, None
+            if total_stock_list and isinstance(total_stock_list[0], dict):
+                try:  # Una conversión por item: todos sus productos comparten el total
+                    total_stock = int(total_stock_list[0].get("total_stock", 0))
+                except (ValueError, TypeError) as e:
+                    error_stock = e
+
+            for producto in stock_item.get("producto", []):
+                try:  # Bloque try para cada producto
+                    pro_cod = producto.get("pro_cod", "").strip()
+                    fila = (
+                        pro_cod,
+                        int(pro_cod) if pro_cod.isdigit() else None,
+                        producto.get("pro_sku", "").strip(),
+                        producto.get("pro_desc", "").strip(),
+                        producto.get("pro_ubicacion", "").strip(),
+                        producto.get("pro_fech_registro", "").strip(),
+                        total_stock,
+                    )
+                    if error_stock is not None:
+                        raise error_stock
+                except (ValueError, TypeError) as e:  # Captura errores de conversión o tipo de dato
+                    logging.error(f"Error al procesar producto: {producto}. Error: {e}")
+                    continue
+                for columna, valor in zip(columnas, fila):
+                    columna.append(valor)
+        return cls(*columnas)
+
+    def __len__(self):
+        return len(self.pro_cod)
+
+    def _filas(self, desde, hasta):
+        ubicaciones = self.ubicaciones
+        columnas = zip(
+            self.pro_cod[desde:hasta],
+            self.pro_cod_int[desde:hasta].tolist(),
+            self._tiene_cod_int[desde:hasta].tolist(),
+            self.pro_cod_valido[desde:hasta].tolist(),
+            self.pro_sku[desde:hasta],
+            self.pro_desc[desde:hasta],
+            self.ubicacion[desde:hasta].tolist(),
+            self.pro_fech_registro[desde:hasta].tolist(),
+            self.total_stock[desde:hasta].tolist(),
+        )
+        for cod, cod_int, tiene_cod_int, valido, sku, desc, ubicacion, fecha, stock in columnas:
+            yield {
+                "pro_cod": cod,
+                "pro_cod_int": cod_int if tiene_cod_int else None,
+                "pro_cod_valido": valido,
+                "pro_sku": sku,
+                "pro_desc": desc,
+                "pro_ubicacion": ubicaciones[ubicacion],
+                "pro_fech_registro": None if fecha != fecha else fecha,  # NaN -> None
+                "total_stock": stock,
+            }
+
+    def __iter__(self):
+        for desde in range(0, len(self), BLOQUE_EXPORTACION):
+            yield from self._filas(desde, desde + BLOQUE_EXPORTACION)
+
+    def fila(self, indice):
+        """Devuelve el producto en la posición indicada como diccionario."""
+        return next(self._filas(indice, indice + 1))
+
+    def a_lista(self):
+        """Exporta el inventario como lista de diccionarios (formato de decode_and_format)."""
+        return list(self)
+
+    def _buscar(self, indice, valor):
+        posicion = indice.get(valor)
+        return None if posicion is None else self.fila(posicion)
+
+    def por_sku(self, pro_sku):
+        """Producto con ese pro_sku (el último si está repetido) o None."""
+        if self._indice_sku is None:
+            self._indice_sku = {sku: i for i, sku in enumerate(self.pro_sku)}
+        return self._buscar(self._indice_sku, pro_sku)
+
+    def por_codigo(self, pro_cod):
+        """Producto con ese pro_cod (el último si está repetido) o None."""
+        if self._indice_cod is None:
+            self._indice_cod = {cod: i for i, cod in enumerate(self.pro_cod)}
+        return self._buscar(self._indice_cod, pro_cod)
+
+    def stock_por_sku(self):
+        """Devuelve {pro_sku: total_stock} de los productos con SKU."""
+        return {sku: stock for sku, stock in zip(self.pro_sku, self.total_stock.tolist()) if sku}
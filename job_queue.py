@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# --- Cola de trabajos persistente (SQLite) ---
+# Cada trabajo tiene una clave (ej. el SKU). Si se encola una clave que ya está
+# pendiente, se reemplaza su payload: gana el último valor y se escribe una sola vez,
+# conservando su lugar en la cola (una clave que se actualiza seguido no se posterga).
+# Si la clave se está procesando, el nuevo valor queda pendiente y se procesa al
+# terminar, así nunca hay dos trabajos de la misma clave en paralelo.
+
+QUEUE_DB = os.getenv("JOB_QUEUE_DB", "config/job_queue.db")
+QUEUE_POLL_SECONDS = float(os.getenv("JOB_QUEUE_POLL_SECONDS", "1"))
+QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", "300"))  # Trabajos "running" más viejos se reintentan
+QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "8"))
+QUEUE_BACKOFF_BASE = 2.0
+QUEUE_BACKOFF_MAX = 300.0
+
+_workers = {}
+_workers_lock = threading.Lock()
+_wakeups = {}
+
+
+def _connect():
+    if os.path.dirname(QUEUE_DB):
+        os.makedirs(os.path.dirname(QUEUE_DB), exist_ok=True)
+    conn = sqlite3.connect(QUEUE_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")  # Varios workers de gunicorn leen y escriben a la vez
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            queue TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            enqueued_at REAL NOT NULL,
+            available_at REAL NOT NULL,
+            claimed_at REAL,
+            PRIMARY KEY (queue, key)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS seen (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+        """
+    )
+    return conn
+
+
+def enqueue(queue, key, payload):
+    """
+    Encola (o reemplaza) el trabajo de una clave.
+
+    :param queue: Nombre de la cola.
+    :param key: Clave de coalescencia (ej. SKU).
+    :param payload: Diccionario serializable a JSON.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            """
+            INSERT INTO jobs (queue, key, payload, enqueued_at, available_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (queue, key) DO UPDATE SET
+                payload = excluded.payload,
+                version = jobs.version + 1,
+                status = CASE WHEN jobs.status = 'running' THEN 'running' ELSE 'pending' END,
+                attempts = 0,
+                last_error = NULL,
+                available_at = excluded.available_at
+            """,
+            (queue, key, json.dumps(payload), now, now),
+        )
+    finally:
+        conn.close()
+
+    wakeup = _wakeups.get(queue)
+    if wakeup:
+        wakeup.set()
+
+
+def _claim(conn, queue):
+    """Toma el trabajo pendiente más antiguo. Devuelve (key, payload, version) o None."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Trabajos de un proceso que murió a mitad de camino
+        conn.execute(
+            "UPDATE jobs SET status = 'pending' WHERE queue = ? AND status = 'running' AND claimed_at < ?",
+            (queue, now - QUEUE_LEASE_SECONDS),
+        )
+        row = conn.execute(
+            """
+            SELECT key, payload, version FROM jobs
+            WHERE queue = ? AND status = 'pending' AND available_at <= ?
+            ORDER BY enqueued_at LIMIT 1
+            """,
+            (queue, now),
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', claimed_at = ? WHERE queue = ? AND key = ?",
+                (now, queue, row[0]),
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _complete(conn, queue, key, version):
+    """Borra el trabajo, salvo que haya llegado un valor más nuevo mientras se procesaba."""
+    conn.execute("DELETE FROM jobs WHERE queue = ? AND key = ? AND version = ?", (queue, key, version))
+    conn.execute("UPDATE jobs SET status = 'pending' WHERE queue = ? AND key = ? AND status = 'running'", (queue, key))
+
+
+def _fail(conn, queue, key, version, error):
+    """Reprograma el trabajo con backoff; tras QUEUE_MAX_ATTEMPTS queda como 'failed'."""
+    row = conn.execute("SELECT version, attempts FROM jobs WHERE queue = ? AND key = ?", (queue, key)).fetchone()
+    if row is None:
+        return
+    if row[0] != version:
+        # Llegó un valor nuevo: se procesa ese, sin heredar los intentos fallidos
+        conn.execute("UPDATE jobs SET status = 'pending' WHERE queue = ? AND key = ?", (queue, key))
+        return
+
+    attempts = row[1] + 1
+    status = "failed" if attempts >= QUEUE_MAX_ATTEMPTS else "pending"
+    delay = random.uniform(0, min(QUEUE_BACKOFF_MAX, QUEUE_BACKOFF_BASE * 2 ** attempts))
+    conn.execute(
+        "UPDATE jobs SET status = ?, attempts = ?, last_error = ?, available_at = ? WHERE queue = ? AND key = ?",
+        (status, attempts, str(error), time.time() + delay, queue, key),
+    )
+
+
+def _worker_loop(queue, handler, wakeup):
+    conn = _connect()
+    while True:
+        try:
+            job = _claim(conn, queue)
+        except sqlite3.Error as e:
+            logging.error(f"Error al leer la cola {queue}: {e}")
+            job = None
+
+        if job is None:
+            wakeup.wait(QUEUE_POLL_SECONDS)
+            wakeup.clear()
+            continue
+
+        key, payload, version = job
+        try:
+            handler(json.loads(payload))
+            _complete(conn, queue, key, version)
+        except Exception as e:
+            logging.error(f"Error procesando {queue}/{key}: {e}")
+            _fail(conn, queue, key, version, e)
+
+
+def start_workers(queue, handler, count):
+    """
+    Arranca (una sola vez por proceso) los hilos que vacían una cola.
+
+    :param handler: Función que recibe el payload; si lanza una excepción, el trabajo se reintenta.
+    """
+    with _workers_lock:
+        if queue in _workers:
+            return
+        wakeup = _wakeups.setdefault(queue, threading.Event())
+        _workers[queue] = [
+            threading.Thread(target=_worker_loop, args=(queue, handler, wakeup), daemon=True)
+            for _ in range(count)
+        ]
+        for thread in _workers[queue]:
+            thread.start()
+
+
+# --- Deduplicación ---
+# Registro de claves ya vistas (ej. notificaciones reintentadas) con vencimiento.
+
+DEDUP_TTL_SECONDS = float(os.getenv("JOB_QUEUE_DEDUP_TTL_SECONDS", "86400"))
+
+
+def mark_seen(namespace, key):
+    """
+    Registra una clave. Devuelve True si es nueva y False si ya se había visto.
+
+    Las claves más viejas que DEDUP_TTL_SECONDS se descartan de vez en cuando.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO seen (namespace, key, seen_at) VALUES (?, ?, ?)",
+            (namespace, key, now),
+        )
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM seen WHERE seen_at < ?", (now - DEDUP_TTL_SECONDS,))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def queue_stats(queue):
+    """Cantidad de trabajos por estado en una cola."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (queue,))
+        return dict(rows.fetchall())
+    finally:
+        conn.close()
@@ -3,47 +3,79 @@ import os
 import threading
 import time
 import logging
-from datetime import datetime
+import zlib
 
-from flask import Flask, jsonify, make_response
+from flask import Flask, Response, jsonify, request
 import requests
+import http_client
+import metrics
 from google.cloud import secretmanager
-from barcode import EAN13
-from barcode.errors import IllegalCharacterError
+from inventario import Inventario
+
+try:
+    import orjson  # Serializador más rápido (opcional)
+except ImportError:
+    orjson = None
 
 # Configuración de logging (más concisa)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
 
 # Variables globales (simplificadas)
 current_token = None
-token_thread = None  # Para controlar el hilo del token
 
 # Configuración de Secret Manager
 PROJECT_ID = "lanch-sync"  # Constante para el ID del proyecto
 SECRET_ID = "API_SECRET_KEY"  # Constante para el ID del secreto
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "config/lanch-sync-e5d12969c196.json"
 
-API_URL = "https://grupologi.com.co/ApiLogi/principal_graph.php"  # URL de la API (constante)
+API_HOST = "grupologi.com.co"
+API_URL = f"https://{API_HOST}/ApiLogi/principal_graph.php"  # URL de la API (constante)
+
+# --- Token de Logi ---
+# El token se pide la primera vez que se necesita (también bajo gunicorn, donde no
+# corre __main__) y se renueva cuando está por vencer o cuando Logi lo rechaza. El
+# cliente de Secret Manager y el secreto se guardan para no repetir esa consulta.
+LOGI_TOKEN_TTL = float(os.getenv("LOGI_TOKEN_TTL", "43200"))  # 12 horas
+LOGI_TOKEN_REFRESH_MARGIN = float(os.getenv("LOGI_TOKEN_REFRESH_MARGIN", "300"))
+
+_token_lock = threading.Lock()
+_token_obtenido = 0.0
+_secret_client = None
+_secret_cache = {}
 
 # --- Funciones ---
 
-def get_secret(project_id, secret_id):
-    """Obtiene el secreto desde Google Secret Manager."""
-    client = secretmanager.SecretManagerServiceClient()
+def get_secret(project_id, secret_id, refrescar=False):
+    """
+    Obtiene el secreto desde Google Secret Manager (se guarda en memoria tras la primera vez).
+
+    Si está definida la variable LOGI_SECRET_KEY (pruebas locales, benchmarks) se usa esa.
+    """
+    global _secret_client
+    if os.getenv("LOGI_SECRET_KEY"):
+        return os.getenv("LOGI_SECRET_KEY")
     secret_path = f"projects/{project_id}/secrets/{secret_id}/versions/latest"
+    if not refrescar and secret_path in _secret_cache:
+        return _secret_cache[secret_path]
+
     try:
-        response = client.access_secret_version(name=secret_path)
-        return response.payload.data.decode("UTF-8").strip()  # Decodifica y elimina espacios en blanco
+        if _secret_client is None:
+            _secret_client = secretmanager.SecretManagerServiceClient()
+        response = _secret_client.access_secret_version(name=secret_path)
+        secret = response.payload.data.decode("UTF-8").strip()  # Decodifica y elimina espacios en blanco
+        _secret_cache[secret_path] = secret
+        return secret
     except Exception as e:
         logging.error(f"Error al obtener el secreto: {e}")
         return None
 
-def get_token():
+def get_token(refrescar_secreto=False):
     """Obtiene y actualiza el token."""
-    global current_token
-    secret_key = get_secret(PROJECT_ID, SECRET_ID)
+    global current_token, _token_obtenido
+    secret_key = get_secret(PROJECT_ID, SECRET_ID, refrescar_secreto)
     if not secret_key:
         logging.error("No se pudo obtener el secreto.")
         return None
@@ -52,13 +84,15 @@ def get_token():
     headers = {'Content-Type': 'application/json'}
 
     try:
-        response = requests.post(API_URL, json=query, headers=headers)
+        response = http_client.post(API_URL, json=query, headers=headers)
         response.raise_for_status()  # Lanza excepción para errores HTTP
         data = response.json()
 
         token_data = data.get("data", {}).get("app_secret_key", [])
         if token_data:
             current_token = token_data[0].get("suc_data", [])[0].get("token")
+            _token_obtenido = time.monotonic()
+            http_client.set_default_headers(API_HOST, {"Authorization": current_token})
             logging.info("Token renovado.")
             return current_token
         else:
@@ -69,6 +103,41 @@ def get_token():
         logging.error(f"Error al obtener el token: {e}")
         return None
 
+def asegurar_token(token_rechazado=None):
+    """
+    Devuelve un token vigente, pidiéndolo si no hay, si está por vencer o si es el rechazado.
+
+    Una sola renovación a la vez: los demás hilos esperan y usan el token nuevo.
+    """
+    with _token_lock:
+        por_vencer = time.monotonic() - _token_obtenido > LOGI_TOKEN_TTL - LOGI_TOKEN_REFRESH_MARGIN
+        if current_token and not por_vencer and current_token != token_rechazado:
+            return current_token
+        token = get_token()
+        if token is None and token_rechazado is not None:
+            token = get_token(refrescar_secreto=True)  # Quizás rotaron el secreto
+        return token
+
+def _es_error_autorizacion(response):
+    """True si Logi rechazó el token (HTTP 401/403 o un error de GraphQL que lo menciona)."""
+    if response.status_code in (401, 403):
+        return True
+    try:
+        errores = response.json().get("errors") or []
+    except (ValueError, AttributeError):
+        return False
+    return any("token" in str(error.get("message", "")).lower() for error in errores if isinstance(error, dict))
+
+def post_logi(**kwargs):
+    """POST a la API de Logi con token; si se rechaza, se renueva y se reintenta una vez."""
+    token = asegurar_token()
+    response = http_client.post(API_URL, **kwargs)
+    if _es_error_autorizacion(response):
+        logging.warning("Logi rechazó el token; se renueva y se reintenta.")
+        if asegurar_token(token_rechazado=token):
+            response = http_client.post(API_URL, **kwargs)
+    return response
+
 def obtener_inventario():
     """Obtiene el inventario desde la API."""
     query = {
@@ -89,10 +158,10 @@ def obtener_inventario():
         }
         """
     }
-    headers = {'Content-Type': 'application/json', 'Authorization': current_token}
+    headers = {'Content-Type': 'application/json'}  # El token lo inyecta http_client
 
     try:
-        response = requests.post(API_URL, data=json.dumps(query), headers=headers)
+        response = post_logi(data=json.dumps(query), headers=headers)
         response.raise_for_status()
         data = response.json()
 
@@ -108,91 +177,126 @@ def obtener_inventario():
         logging.error(f"Error al obtener el inventario: {e}")
         return None
 
-def validar_codigo_barras(codigo):
-    """Valida si un código de barras es EAN-13 o UPC."""
-    try:
-        if len(codigo) == 13:
-            EAN13(codigo)
-            return True
-        elif len(codigo) == 12:
-            EAN13("0" + codigo)  # Intenta extender UPC a EAN-13
-            return True
-        return False
-    except IllegalCharacterError:
-        return False
-    except ValueError:
-        return False
+def _inventario_valido(data):
+    return data and isinstance(data, dict) and data.get("data") and data["data"].get("stock")
+
 
 def decode_and_format(data):
     """Decodifica y formatea los datos del inventario."""
 
-    if not data or not isinstance(data, dict) or not data.get("data") or not data["data"].get("stock"):
+    if not _inventario_valido(data):
         logging.error("Datos de inventario inválidos.")
         return None
 
-    productos_formateados = []
-    for stock_item in data["data"]["stock"]:
-        for producto in stock_item.get("producto", []):
-            try:  # Bloque try para cada producto
-                pro_cod = producto.get("pro_cod", "").strip()
-                pro_sku = producto.get("pro_sku", "").strip()
-                pro_desc = producto.get("pro_desc", "").strip()
-                pro_ubicacion = producto.get("pro_ubicacion", "").strip()
-                pro_fech_registro = producto.get("pro_fech_registro", "").strip()
-
-                pro_cod_int = int(pro_cod) if pro_cod.isdigit() else None  # Intenta convertir a int
-                codigo_valido = validar_codigo_barras(pro_cod) if pro_cod_int is not None else False
-
-                try:
-                    pro_fech_registro_timestamp = datetime.strptime(pro_fech_registro, "%Y-%m-%d %H:%M:%S").timestamp()
-                except ValueError:
-                    logging.warning(f"Fecha inválida: {pro_fech_registro}")
-                    pro_fech_registro_timestamp = None
-
-                total_stock_value = 0
-                total_stock_list = stock_item.get("total_stock", [])
-
-                if total_stock_list and isinstance(total_stock_list[0], dict):
-                    total_stock_value = int(total_stock_list[0].get("total_stock", 0))
-
-                productos_formateados.append({
-                    "pro_cod": pro_cod,
-                    "pro_cod_int": pro_cod_int,
-                    "pro_cod_valido": codigo_valido,
-                    "pro_sku": pro_sku,
-                    "pro_desc": pro_desc,
-                    "pro_ubicacion": pro_ubicacion,
-                    "pro_fech_registro": pro_fech_registro_timestamp,
-                    "total_stock": total_stock_value
-                })
-
-            except (ValueError, TypeError) as e:  # Captura errores de conversión o tipo de dato
-                logging.error(f"Error al procesar producto: {producto}. Error: {e}")
-
-    return productos_formateados
-
-def renew_token_periodically():
-    """Renueva el token periódicamente."""
-    while True:
-        get_token()
-        time.sleep(43200)  # 12 horas
+    return Inventario.desde_respuesta(data).a_lista()
+
+
+# --- Snapshot del inventario en cache ---
+# El inventario se consulta como máximo una vez por STOCK_CACHE_TTL segundos y se
+# guarda por columnas (ver inventario.Inventario) en lugar de un dict por producto.
+
+STOCK_CACHE_TTL = int(os.getenv("LOGI_STOCK_CACHE_TTL", "60"))
+
+_stock_cache = {"productos": None, "actualizado": 0.0}
+_stock_cache_lock = threading.Lock()
+
+
+def obtener_stock():
+    """
+    Devuelve el inventario (Inventario) desde el snapshot en cache, refrescándolo si venció.
+
+    Si el refresco falla se sigue sirviendo el último snapshot disponible.
+    """
+    with _stock_cache_lock:  # Un solo refresco a la vez; el resto espera y reutiliza el resultado
+        vigente = time.monotonic() - _stock_cache["actualizado"] < STOCK_CACHE_TTL
+        if _stock_cache["productos"] is not None and vigente:
+            metrics.record_cache("logi_stock", hits=1)
+            return _stock_cache["productos"]
+        metrics.record_cache("logi_stock", misses=1)
+
+        data = obtener_inventario()
+        if not _inventario_valido(data):
+            if _stock_cache["productos"] is not None:
+                logging.warning("No se pudo refrescar el inventario; se usa el snapshot anterior.")
+            return _stock_cache["productos"]
+
+        productos = Inventario.desde_respuesta(data)
+        logging.info(f"Inventario refrescado: {len(productos)} productos.")
+
+        _stock_cache.update({"productos": productos, "actualizado": time.monotonic()})
+        return productos
+
+
+# --- Serialización en streaming ---
+# /stock se envía por partes (JSON o NDJSON) a medida que se serializa, sin armar el
+# documento completo en memoria. En producción no se indenta y, si está instalado,
+# se usa orjson.
+
+STREAM_CHUNK_SIZE = 64 * 1024
+PRETTY_JSON = os.getenv("FLASK_ENV") != "production"
+
+
+def _serializar(fila, indentar=False):
+    if indentar:
+        return json.dumps(fila, indent=4, ensure_ascii=False).encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(fila)
+    return json.dumps(fila, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _stream_json(filas, ndjson=False):
+    """Produce el inventario como arreglo JSON (o NDJSON) en bloques de ~STREAM_CHUNK_SIZE bytes."""
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    for i, fila in enumerate(filas):
+        if ndjson:
+            buffer += _serializar(fila) + b"\n"  # NDJSON nunca se indenta
+        else:
+            if i:
+                buffer += b","
+            buffer += _serializar(fila, PRETTY_JSON)
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b"]"
+    yield bytes(buffer)
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for chunk in chunks:
+        comprimido = compressor.compress(chunk)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
 
 # --- Rutas de Flask ---
 @app.route('/stock')
 def mostrar_stock():
-    """Muestra el stock en formato JSON."""
+    """
+    Muestra el stock en formato JSON.
+
+    Con ?format=ndjson o Accept: application/x-ndjson se envía un producto por línea.
+    La respuesta se comprime con gzip si el cliente lo acepta.
+    """
     try:
-        data = obtener_inventario()
-        if not data:
+        productos_formateados = obtener_stock()
+        if not productos_formateados:
             return "Error al obtener el inventario."
 
-        productos_formateados = decode_and_format(data)
-        if not productos_formateados:
-            return "Error al procesar los datos del inventario."
+        ndjson = request.args.get("format") == "ndjson" or "application/x-ndjson" in request.headers.get("Accept", "")
+        usar_gzip = request.accept_encodings["gzip"] > 0  # Respeta q-values (ej. gzip;q=0)
 
-        # Convertir a JSON y devolver la respuesta
-        response = make_response(json.dumps(productos_formateados, indent=4, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8' # Encabezado para JSON
+        chunks = _stream_json(productos_formateados, ndjson)
+        if usar_gzip:
+            chunks = _gzip_stream(chunks)
+
+        mimetype = "application/x-ndjson" if ndjson else "application/json"
+        response = Response(chunks, content_type=f"{mimetype}; charset=utf-8")
+        response.headers['Vary'] = 'Accept-Encoding'
+        if usar_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
         return response
 
     except Exception as e:
@@ -200,9 +304,4 @@ def mostrar_stock():
         return f"Error: {e}"
 
 if __name__ == '__main__':
-    # Inicia el hilo del token (una sola vez)
-    if not token_thread:
-        token_thread = threading.Thread(target=renew_token_periodically, daemon=True)
-        token_thread.start()
-
     app.run(debug=False) # debug=False en producción
\ No newline at end of file
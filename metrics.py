@@ -0,0 +1,127 @@
+import os
+import re
+import time
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+from settings import CREDENTIALS
+
+# --- Métricas de Prometheus ---
+# Todas las apps de Flask comparten estas métricas y las exponen en /metrics:
+# latencia por ruta, llamadas a APIs externas (cantidad, latencia y status por host,
+# plantilla de endpoint y cuenta), esperas del limitador de tasa y aciertos de caches.
+# Con gunicorn y varios workers hay que definir PROMETHEUS_MULTIPROC_DIR para que
+# /metrics sume los contadores de todos los procesos.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ACCOUNT_LABELS = set(CREDENTIALS) | {"callback", "default"}  # El resto (ej. tokens) se agrupa como "other"
+
+ROUTE_LATENCY = Histogram(
+    "lanch_route_duration_seconds", "Latencia de las rutas de Flask.",
+    ["app", "method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_CALLS = Counter(
+    "lanch_upstream_requests_total", "Llamadas a APIs externas.",
+    ["host", "endpoint", "account", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "lanch_upstream_request_duration_seconds", "Latencia de las llamadas a APIs externas.",
+    ["host", "endpoint", "account"], buckets=LATENCY_BUCKETS,
+)
+RATE_LIMIT_WAIT = Histogram(
+    "lanch_rate_limit_wait_seconds", "Espera en el limitador de tasa antes de cada llamada.",
+    ["account"], buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RATE_LIMIT_THROTTLED = Counter(
+    "lanch_rate_limit_throttled_total", "Respuestas 429 recibidas por el limitador de tasa.", ["account"],
+)
+CACHE_LOOKUPS = Counter(
+    "lanch_cache_lookups_total", "Consultas a caches locales (hit o miss).", ["cache", "result"],
+)
+
+_ID_SEGMENT = re.compile(r"\d")
+_STATIC_SUFFIXES = (".json", ".php")
+
+
+def endpoint_template(path):
+    """
+    Plantilla de un path para usar como etiqueta: los segmentos con dígitos pasan a
+    {id} y los nombres de archivo (ej. imágenes del CDN) a {file}.
+    """
+    segments = path.strip("/").split("/")
+    template = []
+    for i, segment in enumerate(segments):
+        if i == len(segments) - 1 and "." in segment and not segment.endswith(_STATIC_SUFFIXES):
+            template.append("{file}")
+        elif _ID_SEGMENT.search(segment) or len(segment) > 32:
+            template.append("{id}")
+        else:
+            template.append(segment)
+    return "/" + "/".join(template)
+
+
+def account_label(account):
+    if not account:
+        return ""
+    return account if account in ACCOUNT_LABELS else "other"
+
+
+def record_upstream(host, path, account, status, seconds):
+    """
+    Registra una llamada a una API externa.
+
+    :param status: Código HTTP o "error" si la llamada no obtuvo respuesta.
+    """
+    labels = (host or "", endpoint_template(path), account_label(account))
+    UPSTREAM_CALLS.labels(*labels, str(status)).inc()
+    UPSTREAM_LATENCY.labels(*labels).observe(seconds)
+
+
+def record_rate_limit_wait(account, seconds):
+    RATE_LIMIT_WAIT.labels(account_label(account)).observe(seconds)
+
+
+def record_throttled(account):
+    RATE_LIMIT_THROTTLED.labels(account_label(account)).inc()
+
+
+def record_cache(cache, hits=0, misses=0):
+    """Suma aciertos y fallos de una cache (la proporción se calcula en Prometheus)."""
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def _render():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def instrument_app(app):
+    """Mide la latencia de todas las rutas de una app de Flask y agrega la ruta /metrics."""
+    name = app.import_name
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("metrics_started", None)
+        if started is not None and request.endpoint != "metrics":
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            ROUTE_LATENCY.labels(name, request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(_render(), content_type=CONTENT_TYPE_LATEST)
+
+    return app
@@ -1,7 +1,19 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, redirect, jsonify
-import requests
+import auth
+import http_client
+import metrics
+from bulk import PairFanout, parse_stock_pairs, run_bulk, summarize
+from concurrency import map_ordered
+import ml_catalog
+from job_queue import enqueue, mark_seen, start_workers
+from ml_items import ML_HOST, fetch_items, is_traditional, is_fulfillment, build_stock_update
 
 app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
 
 # Configuración de MercadoLibre
 CLIENT_ID = '8885330221347884'
@@ -43,16 +55,36 @@ def callback():
     if token_response:
         ACCESS_TOKEN = token_response.get('access_token')
         USER_ID, SITE_ID = get_user_data(ACCESS_TOKEN)
+        start_flex_reconciler()
         return f'Autenticación exitosa. User ID: {USER_ID}, Site ID: {SITE_ID}. Access Token: {ACCESS_TOKEN}', 200
     else:
         return 'Error al obtener el token.', 400
   
+# --- Webhooks ---
+# Las notificaciones se confirman de inmediato (MercadoLibre espera respuesta en menos
+# de 500 ms), se descartan los reintentos por (resource, sent) y se encolan por
+# recurso; un procesador en segundo plano consulta solo el recurso afectado.
+
+WEBHOOK_QUEUE = "webhooks"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_TOPICS = ("items", "orders_v2", "stock-locations")
+
+
 @app.route('/webhooks', methods=['POST'])
 def webhooks():
-    """Recibe notificaciones de MercadoLibre, las imprime y responde con OK."""
+    """Recibe notificaciones de MercadoLibre, las encola y responde con OK."""
     try:
         data = request.json  # Obtiene el JSON enviado por MercadoLibre
-        #print(f"Notificación recibida: {data}")  # Imprime en la consola
+        topic = data.get("topic")
+        resource = data.get("resource")
+
+        if topic in WEBHOOK_TOPICS and resource:
+            if mark_seen(WEBHOOK_QUEUE, f"{resource}|{data.get('sent')}"):
+                enqueue(WEBHOOK_QUEUE, f"{topic}:{resource}", {
+                    "topic": topic,
+                    "resource": resource,
+                    "user_id": data.get("user_id"),
+                })
 
         # Responder con HTTP 200 para confirmar la recepción
         return jsonify({"status": "received"}), 200
@@ -60,6 +92,68 @@ def webhooks():
         print(f"Error procesando la notificación: {str(e)}")
         return jsonify({"error": "Bad request"}), 400
 
+
+def _resource_id(resource):
+    """Extrae el ID de un resource como '/items/MCO123' o '/orders/123'."""
+    return resource.rstrip("/").split("/")[-1]
+
+
+def refresh_items(access_token, user_id, item_ids, account=None):
+    """Vuelve a consultar las publicaciones afectadas por una notificación y actualiza el catálogo."""
+    snapshots = ml_catalog.refresh_items(access_token, user_id, item_ids, account)
+    for item_id in item_ids:
+        if item_id in snapshots:
+            print(f"Item {item_id} refrescado desde webhook (status: {snapshots[item_id].get('status')})")
+        else:
+            print(f"No se pudo refrescar el item {item_id}")
+    return snapshots
+
+
+def _order_item_ids(access_token, order_id, account=None):
+    response = http_client.get(f"https://api.mercadolibre.com/orders/{order_id}", token=access_token, account=account)
+    if response.status_code != 200:
+        raise RuntimeError(f"Error {response.status_code} al consultar la orden {order_id}: {response.text}")
+    return [entry["item"]["id"] for entry in response.json().get("order_items", []) if entry.get("item")]
+
+
+def process_notification(payload):
+    """Procesa una notificación encolada refrescando solo los recursos afectados, en la cuenta de su user_id."""
+    cuentas = get_accounts()
+    if not cuentas:
+        raise RuntimeError("No authenticated user. Please authenticate first.")
+
+    if payload.get("user_id"):
+        cuenta = account_for_user(payload["user_id"], cuentas)
+    else:
+        cuenta = cuentas[0] if len(cuentas) == 1 else None
+    if cuenta is None:
+        print(f"Notificación de un usuario sin cuenta configurada ({payload.get('user_id')}), se ignora.")
+        return
+
+    access_token, user_id, _ = account_session(cuenta)
+    topic, resource = payload["topic"], payload["resource"]
+
+    if topic == "items":
+        item_ids = [_resource_id(resource)]
+    elif topic == "orders_v2":
+        # Una venta cambia el stock de las publicaciones de la orden
+        item_ids = _order_item_ids(access_token, _resource_id(resource), cuenta)
+    else:
+        # stock-locations: /user-products/{id}/stock; se refrescan sus publicaciones
+        user_product_id = resource.strip("/").split("/")[1]
+        response = http_client.get(
+            f"https://api.mercadolibre.com/users/{user_id}/items/search",
+            params={"user_product_id": user_product_id},
+            token=access_token,
+            account=cuenta,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Error {response.status_code} al buscar publicaciones de {user_product_id}")
+        item_ids = response.json().get("results", [])
+
+    refresh_items(access_token, user_id, item_ids, cuenta)
+
+
 def get_access_token(code):
     """Intercambia el código de autorización por un token de acceso."""
     payload = {
@@ -69,7 +163,7 @@ def get_access_token(code):
         'code': code,
         'redirect_uri': REDIRECT_URI
     }
-    response = requests.post(TOKEN_URL, data=payload)
+    response = http_client.post(TOKEN_URL, data=payload)
     return response.json() if response.status_code == 200 else None
 
 def get_user_data(access_token):
@@ -77,7 +171,7 @@ def get_user_data(access_token):
     if not access_token:
         return None, None
     
-    response = requests.get("https://api.mercadolibre.com/users/me", headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
+    response = http_client.get("https://api.mercadolibre.com/users/me", token=access_token)
     
     if response.status_code == 200:
         user_data = response.json()
@@ -88,126 +182,191 @@ def get_user_data(access_token):
         print(f"Error {response.status_code}: {response.text}")
         return None, None
 
-def get_listings_by_sku(access_token: str, user_id: str, seller_sku: str):
+def get_listings_by_sku(access_token: str, user_id: str, seller_sku: str, account: str = None):
+    # Primero el catálogo local; la búsqueda en MercadoLibre queda como respaldo
+    # (catálogo aún no construido o vencido, o SKU publicado después del último refresco)
+    item_ids = ml_catalog.lookup_sku(user_id, seller_sku)
+    metrics.record_cache("ml_catalog", hits=int(bool(item_ids)), misses=int(not item_ids))
+    if item_ids is None:
+        ml_catalog.build_catalog_in_background(access_token, user_id, account)
+    elif item_ids:
+        return item_ids
+
     url = f"https://api.mercadolibre.com/users/{user_id}/items/search?seller_sku={seller_sku}"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, token=access_token, account=account)
     
     if response.status_code == 200:
         data = response.json()
-        return data.get("results", [])
+        results = data.get("results", [])
+        if results and item_ids is not None:
+            ml_catalog.refresh_items(access_token, user_id, results, account)  # Se incorporan al catálogo
+        return results
     else:
         print(f"Error {response.status_code}: {response.text}")
         return None
 
 
-def get_traditional_listings(access_token: str, item_ids: list):
-    traditional_listings = []
-    for item_id in item_ids:
-        url = f"https://api.mercadolibre.com/items/{item_id}?include_attributes=all"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            item_data = response.json()
-            if "catalog_listing" in item_data and item_data["catalog_listing"] is False:
-                traditional_listings.append(item_id)
-        else:
-            print(f"Error {response.status_code}: {response.text}")
-    
-    return traditional_listings
+def get_traditional_listings(access_token: str, item_ids: list, snapshots: dict = None, account: str = None):
+    if snapshots is None:
+        snapshots = fetch_items(access_token, item_ids, account=account)
+
+    return [
+        item_id for item_id in item_ids
+        if item_id in snapshots and is_traditional(snapshots[item_id])
+    ]
 
 
-def get_full_listings(access_token, item_ids):
+def get_full_listings(access_token, item_ids, snapshots=None, account=None):
     """
     Clasifica las publicaciones en full (fulfillment) y no_full (sin fulfillment).
     
     :param access_token: Token de acceso de MercadoLibre.
     :param item_ids: Lista de IDs de publicaciones.
+    :param snapshots: Datos ya obtenidos con fetch_items (opcional, evita volver a consultar).
+    :param account: Cuenta para los límites de concurrencia y de tasa (sin cuenta, el cupo compartido "default").
     :return: Diccionario con listas de publicaciones categorizadas.
     """
+    if snapshots is None:
+        snapshots = fetch_items(access_token, item_ids, account=account)
+
     full_listings = {"full": [], "no_full": []}
-    
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
+
     for item_id in item_ids:
-        url = f"https://api.mercadolibre.com/items/{item_id}?include_attributes=all"
-        response = requests.get(url, headers=headers)
-        
-        print(f"Consultando item_id: {item_id}")  # Depuración para saber qué item estamos procesando
-        
-        if response.status_code == 200:
-            item_data = response.json()
-            
-            # Verificar si 'shipping' y 'logistic_type' existen
-            if "shipping" not in item_data or "logistic_type" not in item_data["shipping"]:
-                raise ValueError(f"Logistic type not found for item {item_id}")
-            
-            logistic_type = item_data["shipping"]["logistic_type"]
-            
-            # Verificar si es 'fulfillment' para agregarlo a 'full'
-            if logistic_type == "fulfillment":
-                full_listings["full"].append(item_id)
-            else:
-                full_listings["no_full"].append(item_id)
+        if item_id not in snapshots:
+            continue
+
+        # Verificar si es 'fulfillment' para agregarlo a 'full'
+        if is_fulfillment(item_id, snapshots[item_id]):
+            full_listings["full"].append(item_id)
         else:
-            print(f"Error {response.status_code}: {response.text}")
-    
-    print(f"Resultado final de get_full_listings: {full_listings}")  # Ver el diccionario final
+            full_listings["no_full"].append(item_id)
+
     return full_listings
 
-def update_flex(access_token, site_id, item_ids, stock):
+def _flex_url(site_id, item_id):
+    return f"https://api.mercadolibre.com/sites/{site_id}/shipping/selfservice/items/{item_id}"
+
+
+def update_flex(access_token, site_id, item_ids, stock, user_id=None, account=None):
     """
     Actualiza el estado de 'flex' para cada producto dependiendo del stock.
     
     Si el stock es mayor a cero, activa Flex. Si el stock es cero, desactiva Flex.
+    Con user_id se usa el estado de Flex guardado en el catálogo local: solo se llama
+    a MercadoLibre cuando el stock cruzó el cero o cuando el estado es desconocido.
 
     :param access_token: Token de acceso de MercadoLibre.
     :param site_id: ID del sitio de MercadoLibre.
     :param item_ids: Diccionario con listas de item_ids clasificadas por fulfillment ('full' y 'no_full').
     :param stock: El número de unidades en stock.
+    :param user_id: Vendedor dueño de las publicaciones (opcional, habilita el estado en cache).
+    :param account: Cuenta para los límites de concurrencia y de tasa (sin cuenta, el cupo compartido "default").
+    :return: Diccionario {item_id: resultado} ('activated', 'deactivated', 'unchanged', 'skipped' o 'error').
     """
-    headers = {"Authorization": f"Bearer {access_token}"}
+    # Items de las claves 'full' y 'no_full' en el diccionario item_ids, en ese orden
+    flex_items = list(dict.fromkeys(
+        item_id
+        for fulfillment_type in ["full", "no_full"]
+        for item_id in item_ids.get(fulfillment_type, [])
+    ))
+
+    known_states = ml_catalog.get_flex_states(user_id, flex_items) if user_id else {}
+    if user_id:
+        metrics.record_cache("ml_flex_state", hits=len(known_states), misses=len(flex_items) - len(known_states))
+    new_states = {}
+
+    def _update_item_flex(item_id):
+        if stock < 0:
+            print(f"Item {item_id} no requiere acción porque el stock es negativo.")
+            return "skipped"
+
+        # La consulta y el cambio de un mismo item van juntos para respetar el orden
+        url = _flex_url(site_id, item_id)
+        active = known_states.get(item_id)
+
+        if active is None:
+            # Verificar el estado actual de Flex
+            check_response = http_client.get(url, token=access_token, account=account)
+            if check_response.status_code in (204, 404):
+                active = new_states[item_id] = check_response.status_code == 204
+
+        if active is True and stock > 0:
+            print(f"Item {item_id} ya tiene flex activado, no es necesario cambiarlo.")
+            return "unchanged"  # No hacer nada si ya está activado
+
+        if active is False and stock == 0:
+            print(f"Item {item_id} ya tiene flex desactivado, no es necesario cambiarlo.")
+            return "unchanged"  # No hacer nada si ya está desactivado
+
+        # Activar o desactivar Flex según el stock
+        if stock > 0:
+            response = http_client.post(url, token=access_token, account=account)
+            if response.status_code in [200, 204]:
+                print(f"Item {item_id} activado en flex")
+                new_states[item_id] = True
+                return "activated"
+            print(f"Error al activar flex para {item_id}: {response.status_code} - {response.text}")
+            return "error"
+
+        response = http_client.delete(url, token=access_token, account=account)
+        if response.status_code in [200, 204]:
+            print(f"Item {item_id} desactivado de flex")
+            new_states[item_id] = False
+            return "deactivated"
+        print(f"Error al desactivar flex para {item_id}: {response.status_code} - {response.text}")
+        return "error"
 
-    # Iterar a través de las claves 'full' y 'no_full' en el diccionario item_ids
-    for fulfillment_type in ["full", "no_full"]:
-        if fulfillment_type not in item_ids:
-            continue  # Si no hay ítems en esta categoría, pasamos a la siguiente
+    try:
+        outcomes = map_ordered(_update_item_flex, flex_items, ML_HOST, account=account)
+    finally:
+        if user_id:
+            ml_catalog.set_flex_states(user_id, new_states)
+    return dict(zip(flex_items, outcomes))
 
-        for item_id in item_ids[fulfillment_type]:
-            url = f"https://api.mercadolibre.com/sites/{site_id}/shipping/selfservice/items/{item_id}"
 
-            # Verificar el estado actual de Flex
-            check_response = requests.get(url, headers=headers)
-
-            if check_response.status_code == 204 and stock > 0:
-                print(f"Item {item_id} ya tiene flex activado, no es necesario cambiarlo.")
-                continue  # No hacer nada si ya está activado
-            
-            if check_response.status_code == 404 and stock == 0:
-                print(f"Item {item_id} ya tiene flex desactivado, no es necesario cambiarlo.")
-                continue  # No hacer nada si ya está desactivado
-
-            # Activar o desactivar Flex según el stock
-            if stock > 0:
-                response = requests.post(url, headers=headers)
-                if response.status_code in [200, 204]:
-                    print(f"Item {item_id} activado en flex")
-                else:
-                    print(f"Error al activar flex para {item_id}: {response.status_code} - {response.text}")
-            elif stock == 0:
-                response = requests.delete(url, headers=headers)
-                if response.status_code in [200, 204]:
-                    print(f"Item {item_id} desactivado de flex")
-                else:
-                    print(f"Error al desactivar flex para {item_id}: {response.status_code} - {response.text}")
-            else:
-                print(f"Item {item_id} no requiere acción porque el stock es negativo.")
-
-
-def update_stock(access_token, item_ids, sku, stock):
+def reconcile_flex(access_token, user_id, site_id, account=None):
+    """
+    Vuelve a leer el estado de Flex de todas las publicaciones tradicionales del catálogo.
+
+    Corrige diferencias por cambios hechos fuera de este servicio.
+    """
+    item_ids = ml_catalog.list_flex_candidates(user_id)
+
+    def _check(item_id):
+        return http_client.get(_flex_url(site_id, item_id), token=access_token, account=account).status_code
+
+    states = {
+        item_id: status_code == 204
+        for item_id, status_code in zip(item_ids, map_ordered(_check, item_ids, ML_HOST, account=account))
+        if status_code in (204, 404)
+    }
+    ml_catalog.set_flex_states(user_id, states)
+    print(f"Flex reconciliado: {len(states)} de {len(item_ids)} publicaciones.")
+    return states
+
+
+FLEX_RECONCILE_SECONDS = int(os.getenv("FLEX_RECONCILE_SECONDS", "21600"))  # 6 horas
+_flex_reconciler = None
+
+
+def _reconcile_flex_periodically():
+    while True:
+        time.sleep(FLEX_RECONCILE_SECONDS)
+        try:
+            for_each_account(reconcile_flex)  # Cada cuenta con su token, su catálogo y su cupo
+        except Exception as e:
+            print(f"Error al reconciliar Flex: {e}")
+
+
+def start_flex_reconciler():
+    """Arranca (una vez por proceso) la reconciliación periódica del estado de Flex."""
+    global _flex_reconciler
+    if _flex_reconciler is None:
+        _flex_reconciler = threading.Thread(target=_reconcile_flex_periodically, daemon=True)
+        _flex_reconciler.start()
+
+
+def update_stock(access_token, item_ids, sku, stock, snapshots=None, account=None):
     """
     Actualiza el stock de una variación con un SKU específico solo si el valor cambia.
     También cambia el estado del ítem a "active" si estaba en "paused" y el stock es mayor a 0.
@@ -216,82 +375,274 @@ def update_stock(access_token, item_ids, sku, stock):
     :param item_ids: Diccionario con listas 'full' y 'no_full' de item_ids.
     :param sku: El SKU a actualizar.
     :param stock: El stock a asignar.
+    :param snapshots: Datos ya obtenidos con fetch_items (opcional, evita volver a consultar).
+    :param account: Cuenta para los límites de concurrencia y de tasa (sin cuenta, el cupo compartido "default").
+    :return: Diccionario {item_id: resultado} ('updated', 'unchanged' o 'error').
     """
     base_url = "https://api.mercadolibre.com/items"
     no_full_items = item_ids.get('no_full', [])
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
+    if snapshots is None:
+        snapshots = fetch_items(access_token, no_full_items, account=account)
+
+
+    def _update_item_stock(item_id):
+        item_data = snapshots.get(item_id)
+        if item_data is None:
+            print(f"Error al obtener datos del item {item_id}.")
+            return "error"
+
+        # Si hay cambios en stock o en el estado, enviamos la actualización
+        update_payload = build_stock_update(item_data, sku, stock)
+        if not update_payload:
+            print(f"No se realizaron cambios en el item {item_id}, ya que el stock y el estado son los mismos.")
+            return "unchanged"
+
+        update_url = f"{base_url}/{item_id}"
+        update_response = http_client.put(update_url, json=update_payload, token=access_token, account=account)
+
+        if update_response.status_code == 200:
+            if "variations" in update_payload:
+                print(f"Stock actualizado para el item {item_id}.")
+            if "status" in update_payload:
+                print(f"Estado del item {item_id} cambiado a 'active'.")
+            return "updated"
+
+        print(f"Error al actualizar item {item_id}: {update_response.status_code} - {update_response.text}")
+        return "error"
+
+    outcomes = map_ordered(_update_item_stock, no_full_items, ML_HOST, account=account)
+    return dict(zip(no_full_items, outcomes))
+
+
+def sync_sku_stock(access_token, user_id, site_id, sku, stock, account=None):
+    """
+    Sincroniza el stock de un SKU en todas sus publicaciones.
+
+    Es el flujo completo de /update_stock: búsqueda por SKU, clasificación,
+    actualización de stock y de Flex.
+
+    :param account: Cuenta para los límites de concurrencia y de tasa (sin cuenta, el cupo compartido "default").
+    :return: Diccionario con el resultado del SKU ('ok', 'error' si alguna publicación falló,
+             o 'not_found') y el detalle por item.
+    """
+    # Obtener item_ids de publicaciones activas
+    item_ids = get_listings_by_sku(access_token, user_id, sku, account)
+
+    if not item_ids:
+        return {"sku": sku, "stock": stock, "status": "not_found"}
+
+    # Cada publicación se consulta una sola vez; el resto trabaja sobre los snapshots
+    snapshots = fetch_items(access_token, item_ids, account=account)
+    ml_catalog.upsert_items(user_id, snapshots, index_skus=False)  # Mantiene estado y logística al día
+
+    # Filtrar entre publicaciones tradicionales y full
+    traditional_items = get_traditional_listings(access_token, item_ids, snapshots, account)
+    categorized_items = get_full_listings(access_token, traditional_items, snapshots, account)
+
+    # Actualizar stock
+    stock_results = update_stock(access_token, categorized_items, sku, stock, snapshots, account)
+
+    # Actualizar estado Flex
+    flex_results = update_flex(access_token, site_id, categorized_items, stock, user_id, account)
+
+    failed = "error" in (*stock_results.values(), *flex_results.values())
+    return {
+        "sku": sku,
+        "stock": stock,
+        "status": "error" if failed else "ok",
+        "stock_updates": stock_results,
+        "flex_updates": flex_results,
     }
 
-    for item_id in no_full_items:
-        item_url = f"{base_url}/{item_id}?include_attributes=all"
-        response = requests.get(item_url, headers=headers)
-
-        if response.status_code == 200:
-            item_data = response.json()
-            variations = item_data.get("variations", [])
-            current_status = item_data.get("status", "")
-
-            variations_to_update = []
-            updated_stock = False  # Flag para saber si se debe actualizar el stock
-            total_available_stock = 0  # Variable para verificar stock total
-
-            for variation in variations:
-                current_quantity = variation.get("available_quantity", 0)
-                total_available_stock += current_quantity  # Sumar stock total actual
-
-                for attribute in variation.get("attributes", []):
-                    if attribute.get("id") == "SELLER_SKU" and attribute.get("value_name") == sku:
-                        # Solo actualizamos si el stock es diferente al actual
-                        if current_quantity != stock:
-                            variations_to_update.append({
-                                "id": variation["id"],
-                                "available_quantity": stock
-                            })
-                            updated_stock = True
-                        break  # No es necesario seguir revisando atributos de esta variación
-
-            # Verificamos si debemos cambiar el estado del item a "active"
-            needs_status_update = current_status == "paused" and stock > 0
-
-            # Si hay cambios en stock o en el estado, enviamos la actualización
-            if updated_stock or needs_status_update:
-                update_payload = {}
-                
-                if updated_stock:
-                    update_payload["variations"] = variations_to_update
-
-                if needs_status_update:
-                    update_payload["status"] = "active"
-
-                update_url = f"{base_url}/{item_id}"
-                update_response = requests.put(update_url, json=update_payload, headers=headers)
-
-                if update_response.status_code == 200:
-                    if updated_stock:
-                        print(f"Stock actualizado para el item {item_id}.")
-                    if needs_status_update:
-                        print(f"Estado del item {item_id} cambiado a 'active'.")
-                else:
-                    print(f"Error al actualizar item {item_id}: {update_response.status_code} - {update_response.text}")
-            else:
-                print(f"No se realizaron cambios en el item {item_id}, ya que el stock y el estado son los mismos.")
 
-        else:
-            print(f"Error al obtener datos del item {item_id}: {response.status_code} - {response.text}")
+def sync_stock_batch(access_token, user_id, site_id, pairs, account=None):
+    """
+    Sincroniza muchos SKUs en paralelo (concurrencia acotada) con el mismo flujo que sync_sku_stock.
+
+    :param pairs: Iterable de {sku, stock}.
+    :return: Lista de resultados por SKU en el orden de entrada.
+    """
+    return run_bulk(
+        lambda sku, stock: sync_sku_stock(access_token, user_id, site_id, sku, stock, account),
+        pairs,
+    )
 
 
+# --- Cuentas ---
+# El stock se envía a todas las cuentas con tokens guardados (auth.py), en paralelo y
+# cada una con su propio token y su propio presupuesto en el limitador. Si no hay
+# tokens guardados se usa la sesión del /callback de este módulo.
+
+LEGACY_ACCOUNT = "callback"
+
+_account_users = {}
+
+
+def get_accounts():
+    """Cuentas a las que se envía el stock."""
+    try:
+        cuentas = list(auth.load_tokens())
+    except (FileNotFoundError, ValueError):
+        cuentas = []
+    if not cuentas and ACCESS_TOKEN and USER_ID:
+        cuentas = [LEGACY_ACCOUNT]
+    return cuentas
+
+
+def account_for_user(user_id, cuentas=None):
+    """Devuelve la cuenta cuyo usuario de MercadoLibre es user_id, o None."""
+    for cuenta in get_accounts() if cuentas is None else cuentas:
+        try:
+            if str(account_session(cuenta)[1]) == str(user_id):
+                return cuenta
+        except Exception as e:
+            print(f"Error al consultar el usuario de la cuenta {cuenta}: {e}")
+    return None
+
+
+def account_session(cuenta):
+    """
+    Devuelve (access_token, user_id, site_id) de una cuenta.
+
+    El token sale del almacén de auth.py (se renueva solo); el usuario se consulta una vez por proceso.
+    """
+    if cuenta == LEGACY_ACCOUNT:
+        return ACCESS_TOKEN, USER_ID, SITE_ID
+
+    access_token = auth.get_access_token(cuenta)
+    if not access_token:
+        raise RuntimeError(f"No hay token para la cuenta {cuenta}.")
+
+    user = _account_users.get(cuenta)
+    if user is None:
+        user = auth.get_user_info(cuenta)
+        if not user or "id" not in user:
+            raise RuntimeError(f"No se pudo obtener el usuario de la cuenta {cuenta}.")
+        _account_users[cuenta] = user
+    return access_token, user["id"], user.get("site_id")
+
+
+def for_each_account(func, cuentas=None, on_done=None):
+    """
+    Ejecuta func(access_token, user_id, site_id, cuenta) en todas las cuentas a la vez.
+
+    :param on_done: Función opcional on_done(cuenta) que se llama al terminar cada cuenta, aunque falle.
+    :return: {cuenta: resultado}; si una cuenta falla, su resultado es {"error": mensaje}.
+    """
+    cuentas = get_accounts() if cuentas is None else list(cuentas)
+
+    def _run(cuenta):
+        try:
+            return func(*account_session(cuenta), cuenta)
+        except Exception as e:
+            print(f"Error en la cuenta {cuenta}: {e}")
+            return {"error": str(e)}
+        finally:
+            if on_done:
+                on_done(cuenta)
+
+    if len(cuentas) <= 1:
+        return {cuenta: _run(cuenta) for cuenta in cuentas}
+    with ThreadPoolExecutor(max_workers=len(cuentas)) as executor:
+        return dict(zip(cuentas, executor.map(_run, cuentas)))
+
+
+def sync_sku_stock_all(sku, stock, cuentas=None):
+    """Sincroniza un SKU en todas las cuentas. Devuelve {cuenta: resultado}."""
+    return for_each_account(
+        lambda access_token, user_id, site_id, cuenta: sync_sku_stock(access_token, user_id, site_id, sku, stock, cuenta),
+        cuentas,
+    )
+
+
+def sync_stock_batch_all(pairs, cuentas=None):
+    """
+    Sincroniza muchos SKUs en todas las cuentas. Devuelve {cuenta: lista de resultados}.
+
+    Los pares se reparten a las cuentas a medida que se leen (ver bulk.PairFanout), así
+    un NDJSON se empieza a procesar antes de recibirlo completo.
+    """
+    cuentas = get_accounts() if cuentas is None else list(cuentas)
+    fanout = PairFanout(pairs, cuentas)
+    return for_each_account(
+        lambda access_token, user_id, site_id, cuenta: sync_stock_batch(
+            access_token, user_id, site_id, fanout.feed(cuenta), cuenta
+        ),
+        cuentas,
+        on_done=fanout.close,
+    )
+
 
+UPDATE_STOCK_QUEUE = "update_stock"
+UPDATE_STOCK_WORKERS = int(os.getenv("UPDATE_STOCK_WORKERS", "4"))
+
+
+def process_stock_job(payload):
+    """Procesa un trabajo de la cola de /update_stock en todas las cuentas."""
+    if not get_accounts():
+        raise RuntimeError("No authenticated user. Please authenticate first.")
+
+    results = sync_sku_stock_all(payload["sku"], payload["stock"])
+    for cuenta, result in results.items():
+        if result.get("status") == "not_found":
+            print(f"No items found for SKU {payload['sku']} in {cuenta}")
+
+    # Falla la cuenta completa o alguna publicación (ej. un 429 que agotó los reintentos)
+    failed = [cuenta for cuenta, result in results.items() if "error" in result or result.get("status") == "error"]
+    if failed:
+        # El trabajo se reintenta; en las cuentas que ya quedaron al día no se escribe nada
+        raise RuntimeError(f"Error al actualizar {payload['sku']} en: {', '.join(failed)}")
+
+
+@app.before_request
+def start_background_workers():
+    """
+    Arranca (una vez por proceso) los hilos que vacían las colas de webhooks y de stock
+    y la reconciliación periódica de Flex.
+
+    Se llama con la primera petición de cualquier tipo: los trabajos que quedaron
+    pendientes en la base antes de un reinicio se procesan sin esperar a que llegue
+    otro /update_stock o webhook.
+    """
+    start_workers(WEBHOOK_QUEUE, process_notification, WEBHOOK_WORKERS)
+    start_workers(UPDATE_STOCK_QUEUE, process_stock_job, UPDATE_STOCK_WORKERS)
+    start_flex_reconciler()
+
+
+@app.route('/catalog/build', methods=['POST'])
+def build_catalog_route():
+    """Reconstruye en segundo plano el catálogo local de publicaciones de cada cuenta."""
+    if not get_accounts():
+        return jsonify({"error": "No authenticated user. Please authenticate first."}), 401
+
+    accounts = for_each_account(
+        lambda access_token, user_id, site_id, cuenta: {
+            "message": "Catalog build started"
+            if ml_catalog.build_catalog_in_background(access_token, user_id, cuenta)
+            else "Catalog build already running"
+        }
+    )
+    return jsonify({"accounts": accounts}), 202
+
+
+@app.route('/flex/reconcile', methods=['POST'])
+def reconcile_flex_route():
+    """Vuelve a leer desde MercadoLibre el estado de Flex de las publicaciones del catálogo de cada cuenta."""
+    if not get_accounts():
+        return jsonify({"error": "No authenticated user. Please authenticate first."}), 401
+
+    accounts = {
+        cuenta: states if "error" in states else {"reconciled": len(states), "active": sum(states.values())}
+        for cuenta, states in for_each_account(reconcile_flex).items()
+    }
+    return jsonify({"accounts": accounts}), 200
 
 
 @app.route('/update_stock', methods=['POST'])
 def update_stock_route():
     """Ruta para actualizar el stock de un SKU específico."""
-    global ACCESS_TOKEN, USER_ID, SITE_ID  # Asegúrate de tener SITE_ID definido en tu código
-
-    if not ACCESS_TOKEN or not USER_ID:
+    if not get_accounts():
         return jsonify({"error": "No authenticated user. Please authenticate first."}), 401
 
     data = request.json
@@ -301,25 +652,40 @@ def update_stock_route():
     if not sku or stock is None:
         return jsonify({"error": "Missing SKU or stock"}), 400
 
-    # Obtener item_ids de publicaciones activas
-    item_ids = get_listings_by_sku(ACCESS_TOKEN, USER_ID, sku)
-    
-    if not item_ids:
-        return jsonify({"error": "No items found for the given SKU"}), 404
+    # Se encola y se responde de inmediato; si el SKU ya estaba pendiente, gana este valor
+    enqueue(UPDATE_STOCK_QUEUE, sku, {"sku": sku, "stock": stock})
 
-    # Filtrar entre publicaciones tradicionales y full
-    traditional_items = get_traditional_listings(ACCESS_TOKEN, item_ids)
-    categorized_items = get_full_listings(ACCESS_TOKEN, traditional_items)
+    return jsonify({"message": "Stock update process initiated", "sku": sku, "stock": stock}), 200
 
-    # Actualizar stock
-    update_stock(ACCESS_TOKEN, categorized_items, sku, stock)
 
-    # Actualizar estado Flex
-    update_flex(ACCESS_TOKEN, SITE_ID, categorized_items, stock)
+@app.route('/update_stock/bulk', methods=['POST'])
+def update_stock_bulk_route():
+    """
+    Ruta para actualizar el stock de muchos SKUs (arreglo JSON o NDJSON de pares {sku, stock}).
 
-    return jsonify({"message": "Stock update process initiated", "sku": sku, "stock": stock}), 200
+    Se aplica en todas las cuentas a la vez; la respuesta trae el resumen total y el detalle por cuenta.
+    """
+    if not get_accounts():
+        return jsonify({"error": "No authenticated user. Please authenticate first."}), 401
+
+    try:
+        pairs = parse_stock_pairs(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    accounts = {}
+    all_results = []
+    for cuenta, results in sync_stock_batch_all(pairs).items():
+        if isinstance(results, dict):  # La cuenta completa falló
+            accounts[cuenta] = results
+            continue
+        all_results.extend(results)
+        accounts[cuenta] = {"summary": summarize(results), "results": results}
+
+    return jsonify({"summary": summarize(all_results), "accounts": accounts}), 200
 
 
 
 if __name__ == '__main__':
+    start_background_workers()
     app.run(debug=True, port=5000)
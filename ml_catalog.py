@@ -0,0 +1,304 @@
+import os
+import sqlite3
+import threading
+import time
+
+import http_client
+from ml_items import fetch_items
+
+# --- Catálogo local de publicaciones de MercadoLibre ---
+# Guarda por vendedor (user_id) cada publicación con su estado, si es de catálogo,
+# su logistic_type y su estado de Flex, más el índice SELLER_SKU -> item/variación.
+# Se construye recorriendo todas las publicaciones con search_type=scan y se mantiene
+# al día con los webhooks y con los snapshots que se leen al actualizar stock. Como un
+# webhook perdido no se corrige solo, el catálogo se reconstruye cuando tiene más de
+# ML_CATALOG_REBUILD_SECONDS (mientras tanto se busca por SKU en MercadoLibre).
+
+CATALOG_DB = os.getenv("ML_CATALOG_DB", "config/ml_catalog.db")
+SCAN_PAGE_SIZE = 100  # Máximo permitido por search_type=scan
+ACTIVE_STATUSES = ("active", "paused")  # Publicaciones a las que se les actualiza stock
+CATALOG_REBUILD_SECONDS = int(os.getenv("ML_CATALOG_REBUILD_SECONDS", "86400"))  # 24 horas
+
+# Campos para indexar SKUs: además de las variaciones, los atributos del item y
+# seller_custom_field cubren publicaciones sin variaciones.
+CATALOG_FIELDS = ("id", "catalog_listing", "shipping", "status", "variations", "attributes", "seller_custom_field")
+
+_db_lock = threading.Lock()
+_builds = {}
+_builds_lock = threading.Lock()
+
+
+def _connect():
+    if os.path.dirname(CATALOG_DB):
+        os.makedirs(os.path.dirname(CATALOG_DB), exist_ok=True)
+    conn = sqlite3.connect(CATALOG_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS listings (
+            user_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            status TEXT,
+            catalog_listing INTEGER,
+            logistic_type TEXT,
+            flex INTEGER,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (user_id, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS listing_skus (
+            user_id TEXT NOT NULL,
+            sku TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            variation_id TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (user_id, sku, item_id, variation_id)
+        );
+        CREATE INDEX IF NOT EXISTS listing_skus_item ON listing_skus (user_id, item_id);
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            user_id TEXT PRIMARY KEY,
+            built_at REAL NOT NULL
+        );
+        """
+    )
+    return conn
+
+
+def _seller_skus(item_data):
+    """Devuelve [(sku, variation_id)] de una publicación ('' si el SKU es del item)."""
+    skus = []
+    for variation in item_data.get("variations") or []:
+        for attribute in variation.get("attributes", []):
+            if attribute.get("id") == "SELLER_SKU" and attribute.get("value_name"):
+                skus.append((attribute["value_name"], str(variation["id"])))
+
+    for attribute in item_data.get("attributes") or []:
+        if attribute.get("id") == "SELLER_SKU" and attribute.get("value_name"):
+            skus.append((attribute["value_name"], ""))
+    if item_data.get("seller_custom_field"):
+        skus.append((item_data["seller_custom_field"], ""))
+    return skus
+
+
+def upsert_items(user_id, snapshots, index_skus=True):
+    """
+    Guarda o actualiza publicaciones en el catálogo.
+
+    :param user_id: Vendedor dueño de las publicaciones.
+    :param snapshots: {item_id: datos} (ej. de fetch_items).
+    :param index_skus: Si es True, reemplaza los SKUs indexados de cada item; usar solo
+                       con snapshots pedidos con CATALOG_FIELDS.
+    """
+    now = time.time()
+    user_id = str(user_id)
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                for item_id, item_data in snapshots.items():
+                    catalog_listing = item_data.get("catalog_listing")
+                    conn.execute(
+                        """
+                        INSERT INTO listings (user_id, item_id, status, catalog_listing, logistic_type, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (user_id, item_id) DO UPDATE SET
+                            status = excluded.status,
+                            catalog_listing = excluded.catalog_listing,
+                            logistic_type = excluded.logistic_type,
+                            updated_at = excluded.updated_at
+                        """,
+                        (
+                            user_id,
+                            item_id,
+                            item_data.get("status"),
+                            None if catalog_listing is None else int(bool(catalog_listing)),
+                            (item_data.get("shipping") or {}).get("logistic_type"),
+                            now,
+                        ),
+                    )
+                    if index_skus:
+                        conn.execute("DELETE FROM listing_skus WHERE user_id = ? AND item_id = ?", (user_id, item_id))
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO listing_skus (user_id, sku, item_id, variation_id) VALUES (?, ?, ?, ?)",
+                            [(user_id, sku, item_id, variation_id) for sku, variation_id in _seller_skus(item_data)],
+                        )
+        finally:
+            conn.close()
+
+
+def refresh_items(access_token, user_id, item_ids, account=None):
+    """Vuelve a consultar publicaciones y las guarda en el catálogo. Devuelve los snapshots."""
+    snapshots = fetch_items(access_token, item_ids, fields=CATALOG_FIELDS, account=account)
+    upsert_items(user_id, snapshots)
+    return snapshots
+
+
+def lookup_sku(user_id, sku):
+    """
+    Devuelve los item_ids activos o pausados que tienen un SELLER_SKU.
+
+    :return: Lista de item_ids (puede estar vacía) o None si el catálogo del vendedor aún no está
+             construido o tiene más de CATALOG_REBUILD_SECONDS y hay que reconstruirlo.
+    """
+    user_id = str(user_id)
+    with _db_lock:
+        conn = _connect()
+        try:
+            meta = conn.execute("SELECT built_at FROM catalog_meta WHERE user_id = ?", (user_id,)).fetchone()
+            if meta is None or time.time() - meta[0] > CATALOG_REBUILD_SECONDS:
+                return None
+            rows = conn.execute(
+                f"""
+                SELECT DISTINCT s.item_id FROM listing_skus s
+                JOIN listings l ON l.user_id = s.user_id AND l.item_id = s.item_id
+                WHERE s.user_id = ? AND s.sku = ? AND l.status IN ({",".join("?" * len(ACTIVE_STATUSES))})
+                ORDER BY s.item_id
+                """,
+                (user_id, sku, *ACTIVE_STATUSES),
+            )
+            return [row[0] for row in rows.fetchall()]
+        finally:
+            conn.close()
+
+
+def get_listing(user_id, item_id):
+    """Devuelve los datos guardados de una publicación (con sus SKUs) o None."""
+    with _db_lock:
+        conn = _connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM listings WHERE user_id = ? AND item_id = ?", (str(user_id), item_id)
+            ).fetchone()
+            if row is None:
+                return None
+            listing = dict(row)
+            listing["skus"] = [
+                dict(sku_row) for sku_row in conn.execute(
+                    "SELECT sku, variation_id FROM listing_skus WHERE user_id = ? AND item_id = ?",
+                    (str(user_id), item_id),
+                )
+            ]
+            return listing
+        finally:
+            conn.close()
+
+
+def get_flex_states(user_id, item_ids):
+    """Devuelve {item_id: True/False} con el estado de Flex conocido (se omiten los desconocidos)."""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return {}
+    with _db_lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT item_id, flex FROM listings
+                WHERE user_id = ? AND flex IS NOT NULL AND item_id IN ({",".join("?" * len(item_ids))})
+                """,
+                (str(user_id), *item_ids),
+            )
+            return {item_id: bool(flex) for item_id, flex in rows.fetchall()}
+        finally:
+            conn.close()
+
+
+def set_flex_states(user_id, states):
+    """Registra el estado de Flex de publicaciones: {item_id: True/False}."""
+    if not states:
+        return
+    now = time.time()
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO listings (user_id, item_id, flex, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (user_id, item_id) DO UPDATE SET flex = excluded.flex
+                    """,
+                    [(str(user_id), item_id, int(active), now) for item_id, active in states.items()],
+                )
+        finally:
+            conn.close()
+
+
+def list_flex_candidates(user_id):
+    """Publicaciones tradicionales activas o pausadas (las que pueden tener Flex)."""
+    with _db_lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT item_id FROM listings
+                WHERE user_id = ? AND catalog_listing = 0 AND status IN ({",".join("?" * len(ACTIVE_STATUSES))})
+                ORDER BY item_id
+                """,
+                (str(user_id), *ACTIVE_STATUSES),
+            )
+            return [row[0] for row in rows.fetchall()]
+        finally:
+            conn.close()
+
+
+def _scan_item_ids(access_token, user_id, account=None):
+    """Recorre todas las publicaciones del vendedor con search_type=scan (sin el límite de offset)."""
+    url = f"https://api.mercadolibre.com/users/{user_id}/items/search"
+    params = {"search_type": "scan", "limit": SCAN_PAGE_SIZE}
+
+    while True:
+        response = http_client.get(url, params=params, token=access_token, account=account)
+        if response.status_code != 200:
+            raise RuntimeError(f"Error {response.status_code} al recorrer publicaciones: {response.text}")
+
+        data = response.json()
+        results = data.get("results", [])
+        if not results:
+            return
+        yield results
+
+        params = {"search_type": "scan", "limit": SCAN_PAGE_SIZE, "scroll_id": data.get("scroll_id")}
+
+
+def build_catalog(access_token, user_id, account=None):
+    """
+    Construye (o reconstruye) el catálogo completo de un vendedor.
+
+    Las publicaciones que ya no aparecen en el recorrido se eliminan del catálogo.
+    """
+    started_at = time.time()
+    total = 0
+    for item_ids in _scan_item_ids(access_token, user_id, account):
+        total += len(refresh_items(access_token, user_id, item_ids, account))
+
+    user_id = str(user_id)
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                stale = "SELECT item_id FROM listings WHERE user_id = ? AND updated_at < ?"
+                conn.execute(f"DELETE FROM listing_skus WHERE user_id = ? AND item_id IN ({stale})", (user_id, user_id, started_at))
+                conn.execute("DELETE FROM listings WHERE user_id = ? AND updated_at < ?", (user_id, started_at))
+                conn.execute("INSERT OR REPLACE INTO catalog_meta (user_id, built_at) VALUES (?, ?)", (user_id, started_at))
+        finally:
+            conn.close()
+
+    print(f"Catálogo de {user_id} construido: {total} publicaciones.")
+    return total
+
+
+def build_catalog_in_background(access_token, user_id, account=None):
+    """Lanza build_catalog en un hilo, una sola construcción a la vez por vendedor."""
+    with _builds_lock:
+        thread = _builds.get(str(user_id))
+        if thread is not None and thread.is_alive():
+            return False
+
+        def _build():
+            try:
+                build_catalog(access_token, user_id, account)
+            except Exception as e:
+                print(f"Error al construir el catálogo de {user_id}: {e}")
+
+        _builds[str(user_id)] = threading.Thread(target=_build, daemon=True)
+        _builds[str(user_id)].start()
+        return True
@@ -0,0 +1,97 @@
+import http_client
+from concurrency import map_ordered
+
+ML_HOST = "api.mercadolibre.com"
+ITEMS_URL = f"https://{ML_HOST}/items"
+MULTIGET_LIMIT = 20  # Máximo de IDs por llamada a /items?ids=
+
+# Campos que leen la clasificación y la actualización de stock. Las variaciones
+# traen sus atributos (SELLER_SKU) gracias a include_attributes=all.
+ITEM_FIELDS = ("id", "catalog_listing", "shipping", "status", "variations")
+
+# --- Snapshots de publicaciones ---
+# Cada publicación se consulta una sola vez por request y las etapas siguientes
+# (clasificación, búsqueda de variaciones por SKU y decisión de escritura)
+# trabajan sobre el diccionario en memoria.
+
+def fetch_items(access_token, item_ids, fields=ITEM_FIELDS, account=None):
+    """
+    Obtiene los datos de cada publicación una sola vez usando el multiget de /items.
+
+    :param access_token: Token de acceso de MercadoLibre.
+    :param item_ids: Lista de IDs de publicaciones (se ignoran los repetidos).
+    :param fields: Campos a solicitar; None trae la publicación completa.
+    :param account: Cuenta para los límites de concurrencia y de tasa (sin cuenta, el cupo compartido "default").
+    :return: Diccionario {item_id: datos de la publicación}.
+    """
+    unique_ids = list(dict.fromkeys(item_ids))
+    chunks = [unique_ids[start:start + MULTIGET_LIMIT] for start in range(0, len(unique_ids), MULTIGET_LIMIT)]
+
+    def _fetch_chunk(chunk):
+        params = {"ids": ",".join(chunk), "include_attributes": "all"}
+        if fields:
+            params["attributes"] = ",".join(fields)
+
+        response = http_client.get(ITEMS_URL, params=params, token=access_token, account=account)
+        if response.status_code != 200:
+            print(f"Error {response.status_code}: {response.text}")
+            return []
+        return response.json()
+
+    snapshots = {}
+    for entries in map_ordered(_fetch_chunk, chunks, ML_HOST, account=account):
+        for entry in entries:
+            body = entry.get("body") or {}
+            if entry.get("code") == 200 and body.get("id"):
+                snapshots[body["id"]] = body
+            else:
+                print(f"Error {entry.get('code')}: {body}")
+
+    return snapshots
+
+
+def is_traditional(item_data):
+    """Indica si la publicación es tradicional (no es de catálogo)."""
+    return item_data.get("catalog_listing") is False
+
+
+def is_fulfillment(item_id, item_data):
+    """Indica si la publicación se despacha por Full (fulfillment)."""
+    shipping = item_data.get("shipping") or {}
+    if "logistic_type" not in shipping:
+        raise ValueError(f"Logistic type not found for item {item_id}")
+    return shipping["logistic_type"] == "fulfillment"
+
+
+def build_stock_update(item_data, sku, stock):
+    """
+    Calcula el payload de actualización de una publicación para un SKU.
+
+    Solo incluye las variaciones cuyo SELLER_SKU coincide y cuyo stock es distinto
+    al actual, y el cambio de estado a "active" si estaba pausada, hay stock y alguna
+    variación tiene el SKU (una publicación a la que le quitaron el SKU no se reactiva).
+
+    :return: Diccionario con las claves 'variations' y/o 'status', vacío si no hay cambios.
+    """
+    variations_to_update = []
+    matched = False
+
+    for variation in item_data.get("variations", []):
+        current_quantity = variation.get("available_quantity", 0)
+
+        for attribute in variation.get("attributes", []):
+            if attribute.get("id") == "SELLER_SKU" and attribute.get("value_name") == sku:
+                matched = True
+                if current_quantity != stock:
+                    variations_to_update.append({
+                        "id": variation["id"],
+                        "available_quantity": stock
+                    })
+                break
+
+    update_payload = {}
+    if variations_to_update:
+        update_payload["variations"] = variations_to_update
+    if matched and item_data.get("status", "") == "paused" and stock > 0:
+        update_payload["status"] = "active"
+    return update_payload
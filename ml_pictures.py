@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import http_client
+import metrics
+from concurrency import map_ordered
+from ml_items import ML_HOST
+
+# --- Cache de imágenes subidas a MercadoLibre ---
+# Cada imagen de Shopify se sube una sola vez por cuenta a /pictures/items/upload y se
+# guarda el picture ID que devuelve MercadoLibre, por URL y por hash del contenido
+# (la misma foto con otra URL tampoco se vuelve a subir). Las publicaciones clonadas
+# usan esos IDs en lugar de que MercadoLibre descargue y procese la imagen otra vez.
+
+PICTURES_DB = os.getenv("ML_PICTURES_DB", "config/ml_pictures.db")
+PICTURES_UPLOAD_URL = f"https://{ML_HOST}/pictures/items/upload"
+
+_db_lock = threading.Lock()
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def _connect():
+    if os.path.dirname(PICTURES_DB):
+        os.makedirs(os.path.dirname(PICTURES_DB), exist_ok=True)
+    conn = sqlite3.connect(PICTURES_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS pictures (
+            account TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            picture_id TEXT NOT NULL,
+            uploaded_at REAL NOT NULL,
+            PRIMARY KEY (account, content_hash)
+        );
+        CREATE TABLE IF NOT EXISTS picture_urls (
+            account TEXT NOT NULL,
+            url TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            PRIMARY KEY (account, url)
+        );
+        """
+    )
+    return conn
+
+
+def _lookup_url(account, url):
+    with _db_lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                """
+                SELECT p.picture_id FROM picture_urls u
+                JOIN pictures p ON p.account = u.account AND p.content_hash = u.content_hash
+                WHERE u.account = ? AND u.url = ?
+                """,
+                (account, url),
+            ).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+
+def _lookup_hash(account, content_hash):
+    with _db_lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT picture_id FROM pictures WHERE account = ? AND content_hash = ?", (account, content_hash)
+            ).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+
+def _remember(account, url, content_hash, picture_id=None):
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                if picture_id:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO pictures (account, content_hash, picture_id, uploaded_at) VALUES (?, ?, ?, ?)",
+                        (account, content_hash, picture_id, time.time()),
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO picture_urls (account, url, content_hash) VALUES (?, ?, ?)",
+                    (account, url, content_hash),
+                )
+        finally:
+            conn.close()
+
+
+def upload_picture(access_token, account, url):
+    """
+    Devuelve el picture ID de una imagen, subiéndola solo si la cuenta no la tiene ya.
+
+    :param access_token: Token de la cuenta donde se va a publicar.
+    :param account: Cuenta dueña de la imagen (clave de CREDENTIALS).
+    :param url: URL de la imagen (ej. originalSrc de Shopify).
+    :return: El picture ID o None si no se pudo descargar o subir.
+    """
+    with _key_lock(account, url):  # La misma imagen pedida por dos clones a la vez se sube una sola vez
+        return _upload_picture(access_token, account, url)
+
+
+def _key_lock(account, key):
+    with _key_locks_lock:
+        return _key_locks.setdefault((account, key), threading.Lock())
+
+
+def _upload_picture(access_token, account, url):
+    picture_id = _lookup_url(account, url)
+    if picture_id:
+        metrics.record_cache("ml_pictures", hits=1)
+        return picture_id
+
+    response = http_client.get(url)
+    if response.status_code != 200:
+        print(f"Error al descargar la imagen {url}: {response.status_code}")
+        return None
+
+    content = response.content
+    content_hash = hashlib.sha256(content).hexdigest()
+    with _key_lock(account, content_hash):
+        picture_id = _lookup_hash(account, content_hash)
+        if picture_id:
+            metrics.record_cache("ml_pictures", hits=1)  # Misma imagen con otra URL
+            _remember(account, url, content_hash)
+            return picture_id
+        metrics.record_cache("ml_pictures", misses=1)
+        return _send_picture(access_token, account, url, content, content_hash, response.headers)
+
+
+def _send_picture(access_token, account, url, content, content_hash, headers):
+    """Sube el contenido de una imagen a MercadoLibre y guarda su picture ID."""
+    filename = os.path.basename(urlsplit(url).path) or "imagen.jpg"
+    mimetype = headers.get("Content-Type", "image/jpeg")
+    upload = http_client.post(
+        PICTURES_UPLOAD_URL, files={"file": (filename, content, mimetype)}, token=access_token, account=account
+    )
+    if upload.status_code not in (200, 201):
+        print(f"Error al subir la imagen {url}: {upload.status_code} - {upload.text}")
+        return None
+
+    picture_id = upload.json().get("id")
+    if picture_id:
+        _remember(account, url, content_hash, picture_id)
+    return picture_id
+
+
+def get_picture_ids(access_token, account, urls):
+    """
+    Resuelve el picture ID de varias imágenes (subiendo en paralelo las que falten).
+
+    :return: Lista en el mismo orden que urls; None en las que fallaron.
+    """
+    def _upload(url):
+        try:
+            return upload_picture(access_token, account, url)
+        except Exception as e:
+            print(f"Error al subir la imagen {url}: {e}")
+            return None
+
+    return map_ordered(_upload, list(urls), ML_HOST, account=account)
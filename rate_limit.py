@@ -0,0 +1,141 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+# Hosts cuyo tráfico pasa por el limitador
+RATE_LIMITED_HOSTS = {"api.mercadolibre.com"}
+
+# --- Configuración ---
+# ML_RATE_PER_SECOND: tasa inicial por cuenta; se ajusta entre ML_RATE_MIN y ML_RATE_MAX.
+# ML_RATE_BURST: llamadas que se pueden hacer de golpe antes de esperar.
+# ML_LATENCY_TARGET: segundos de latencia a partir de los cuales se reduce la tasa.
+# ML_MAX_RETRIES: reintentos de una llamada que respondió 429.
+ML_RATE_PER_SECOND = float(os.getenv("ML_RATE_PER_SECOND", "10"))
+ML_RATE_MIN = float(os.getenv("ML_RATE_MIN", "1"))
+ML_RATE_MAX = float(os.getenv("ML_RATE_MAX", "50"))
+ML_RATE_BURST = float(os.getenv("ML_RATE_BURST", "10"))
+ML_LATENCY_TARGET = float(os.getenv("ML_LATENCY_TARGET", "2"))
+ML_MAX_RETRIES = int(os.getenv("ML_MAX_RETRIES", "5"))
+ML_BACKOFF_BASE = float(os.getenv("ML_BACKOFF_BASE", "0.5"))
+ML_BACKOFF_MAX = float(os.getenv("ML_BACKOFF_MAX", "30"))
+
+RATE_INCREASE = 1.0  # Aumento aditivo: ~1 llamada/s más por cada segundo sin 429
+RATE_DECREASE = 0.5  # Reducción multiplicativa ante un 429
+LATENCY_DECREASE = 0.9  # Reducción suave cuando la latencia supera el objetivo
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket con tasa ajustada por AIMD.
+
+    Cada respuesta correcta sube la tasa de forma aditiva; un 429 la reduce a la mitad
+    y bloquea la cuenta hasta que vence el Retry-After (o el backoff calculado).
+    """
+
+    def __init__(self, rate=ML_RATE_PER_SECOND, burst=ML_RATE_BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Espera hasta tener un turno disponible. Devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self, latency):
+        with self.lock:
+            if latency > ML_LATENCY_TARGET:
+                self.rate = max(ML_RATE_MIN, self.rate * LATENCY_DECREASE)
+            else:
+                self.rate = min(ML_RATE_MAX, self.rate + RATE_INCREASE / self.rate)
+
+    def on_throttle(self, delay):
+        with self.lock:
+            now = time.monotonic()
+            self.rate = max(ML_RATE_MIN, self.rate * RATE_DECREASE)
+            self.tokens = 0
+            self.blocked_until = max(self.blocked_until, now + delay)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(account):
+    """Devuelve el limitador de una cuenta (cada cuenta tiene su propio presupuesto)."""
+    with _limiters_lock:
+        if account not in _limiters:
+            _limiters[account] = AdaptiveLimiter()
+        return _limiters[account]
+
+
+def _retry_after_seconds(value):
+    """Interpreta el encabezado Retry-After (segundos o fecha HTTP)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Espera antes del siguiente intento: Retry-After si viene, si no backoff exponencial con jitter."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, ML_BACKOFF_BASE)
+    return random.uniform(0, min(ML_BACKOFF_MAX, ML_BACKOFF_BASE * 2 ** attempt))
+
+
+def call(account, send):
+    """
+    Ejecuta una llamada respetando el presupuesto de la cuenta.
+
+    Las respuestas 429 se reintentan (hasta ML_MAX_RETRIES) en lugar de perderse.
+
+    :param account: Cuenta dueña de la llamada (clave de CREDENTIALS).
+    :param send: Función sin argumentos que hace la llamada y devuelve la respuesta.
+    :return: requests.Response (la última, si se agotan los reintentos).
+    """
+    limiter = get_limiter(account)
+
+    for attempt in range(ML_MAX_RETRIES + 1):
+        metrics.record_rate_limit_wait(account, limiter.acquire())
+        start = time.monotonic()
+        response = send()
+
+        if response.status_code != 429:
+            limiter.on_success(time.monotonic() - start)
+            return response
+
+        metrics.record_throttled(account)
+        retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+        limiter.on_throttle(backoff_delay(attempt, retry_after))
+
+    return response
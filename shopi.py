@@ -1,11 +1,19 @@
 from flask import Flask, request, jsonify
 import requests
+import http_client
+import metrics
+import json
 import os
+import threading
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from bulk import parse_stock_pairs, validate_pair, summarize
 
 load_dotenv(dotenv_path="config/.env")
 
 app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
 
 # Variables de configuración (centralizadas)
 SHOP_NAME = os.getenv("SHOPIFY_STORE")
@@ -18,41 +26,151 @@ HEADERS = {
     "Content-Type": "application/json",
     "X-Shopify-Access-Token": ACCESS_TOKEN
 }
+http_client.set_default_headers(SHOP_NAME, HEADERS)  # Todas las llamadas a la tienda llevan el token
+
+# --- Ejecutor GraphQL con control de costo ---
+# Shopify limita la API GraphQL con un leaky bucket de puntos de costo y devuelve su
+# estado en extensions.cost.throttleStatus. Se lleva una estimación local del
+# presupuesto para esperar lo justo antes de enviar una consulta en vez de recibir
+# THROTTLED y reintentar a ciegas.
+
+GRAPHQL_MAX_RETRIES = int(os.getenv("SHOPIFY_GRAPHQL_MAX_RETRIES", "5"))
+DEFAULT_QUERY_COST = 50  # Costo asumido para una consulta que aún no se ha ejecutado
+
+_budget = {
+    "maximum": 1000.0,
+    "available": 1000.0,
+    "restore_rate": 50.0,
+    "updated": time.monotonic(),
+}
+_query_costs = {}  # Último requestedQueryCost conocido por consulta
+_budget_lock = threading.Lock()
+
+
+def _restore_budget(now):
+    elapsed = now - _budget["updated"]
+    _budget["available"] = min(_budget["maximum"], _budget["available"] + elapsed * _budget["restore_rate"])
+    _budget["updated"] = now
+
+
+def graphql_budget():
+    """Devuelve el presupuesto estimado {maximum, available, restore_rate} para dimensionar lotes."""
+    with _budget_lock:
+        _restore_budget(time.monotonic())
+        return {key: _budget[key] for key in ("maximum", "available", "restore_rate")}
+
+
+def _reserve_budget(cost):
+    """Espera hasta que el presupuesto alcance para la consulta y lo descuenta."""
+    while True:
+        with _budget_lock:
+            now = time.monotonic()
+            _restore_budget(now)
+            cost = min(cost, _budget["maximum"])
+            if _budget["available"] >= cost:
+                _budget["available"] -= cost
+                return
+            delay = (cost - _budget["available"]) / _budget["restore_rate"]
+        time.sleep(delay)
+
+
+def _record_cost(query, cost):
+    """Actualiza el presupuesto con lo que informó Shopify."""
+    if not cost:
+        return
+    status = cost.get("throttleStatus") or {}
+    with _budget_lock:
+        if cost.get("requestedQueryCost") is not None:
+            _query_costs[query] = cost["requestedQueryCost"]
+        if status:
+            _budget["maximum"] = float(status.get("maximumAvailable", _budget["maximum"]))
+            _budget["available"] = float(status.get("currentlyAvailable", _budget["available"]))
+            _budget["restore_rate"] = float(status.get("restoreRate", _budget["restore_rate"]))
+            _budget["updated"] = time.monotonic()
+
+
+def _is_throttled(data):
+    return any(
+        (error.get("extensions") or {}).get("code") == "THROTTLED"
+        for error in data.get("errors") or []
+    )
+
+
+def graphql(payload):
+    """
+    Ejecuta una consulta GraphQL respetando el presupuesto de costo de Shopify.
+
+    :param payload: Diccionario con 'query' y opcionalmente 'variables'.
+    :return: La respuesta JSON completa (data, errors, extensions).
+    """
+    query = payload["query"]
+
+    for attempt in range(GRAPHQL_MAX_RETRIES + 1):
+        _reserve_budget(_query_costs.get(query, DEFAULT_QUERY_COST))
+
+        response = http_client.post(GRAPHQL_URL, json=payload)
+        response.raise_for_status()  # Lanza una excepción si el status code no es 200
 
-# --- Funciones principales ---
+        data = response.json()
+        _record_cost(query, (data.get("extensions") or {}).get("cost"))
 
-def get_url_pics_sku(sku):
-    """Busca un SKU en Shopify usando GraphQL."""
-    query = {
-        "query": f"""
-        {{
-          productVariants(first: 10, query: "sku:{sku}") {{
-            edges {{
-              node {{
-                id
-                sku
-                product {{
-                  id
-                  title
-                  images(first: 10) {{
-                    edges {{
-                      node {{
-                        originalSrc
-                      }}
-                    }}
-                  }}
-                }}
-              }}
-            }}
-          }}
-        }}
-        """
+        if not _is_throttled(data) or attempt == GRAPHQL_MAX_RETRIES:
+            return data
+        # El presupuesto ya quedó actualizado con lo que informó Shopify, así que
+        # el siguiente _reserve_budget espera exactamente lo necesario.
+
+
+# --- Funciones principales ---
+# El SKU va como variable: el texto de la consulta es fijo y el costo aprendido en
+# _query_costs se reutiliza para todos los SKUs (y la cache no crece con cada uno).
+
+PICS_BY_SKU_QUERY = """
+query ($query: String) {
+  productVariants(first: 10, query: $query) {
+    edges {
+      node {
+        id
+        sku
+        product {
+          id
+          title
+          images(first: 10) {
+            edges {
+              node {
+                originalSrc
+              }
+            }
+          }
+        }
+      }
     }
+  }
+}
+"""
+
+VARIANT_BY_SKU_QUERY = """
+query ($query: String) {
+  productVariants(first: 1, query: $query) {
+    edges {
+      node {
+        id
+        sku
+        product {
+          id
+        }
+        inventoryItem {
+          id
+        }
+      }
+    }
+  }
+}
+"""
 
-    response = requests.post(GRAPHQL_URL, json=query, headers=HEADERS)
-    response.raise_for_status()  # Lanza una excepción si el status code no es 200
 
-    data = response.json()
+def get_url_pics_sku(sku):
+    """Busca un SKU en Shopify usando GraphQL."""
+    data = graphql({"query": PICS_BY_SKU_QUERY, "variables": {"query": f"sku:{sku}"}})
     variants = data.get("data", {}).get("productVariants", {}).get("edges", [])
 
     if not variants:
@@ -64,116 +182,277 @@ def get_url_pics_sku(sku):
 
     return images
 
-def get_inventory_item_id(sku):
-    """Obtiene el inventoryItemId basado en el SKU."""
-
-    query = {
-        "query": f"""
-        {{
-          productVariants(first: 1, query: "sku:{sku}") {{
-            edges {{
-              node {{
-                inventoryItem {{
-                  id
-                }}
-              }}
-            }}
-          }}
-        }}
-        """
-    }
+def _gid_id(gid):
+    """Extrae el ID numérico de un gid de Shopify (gid://shopify/Tipo/123)."""
+    return gid.split("/")[-1] if gid else None
 
-    try:
-        response = requests.post(GRAPHQL_URL, json=query, headers=HEADERS)
-        response.raise_for_status()  # Lanza una excepción para manejar errores HTTP
 
-        data = response.json()
-        variants = data.get("data", {}).get("productVariants", {}).get("edges", [])
-
-        if not variants:
-            return None  # SKU no encontrado
+def _variant_entry(node):
+    inventory_item_gid = (node.get("inventoryItem") or {}).get("id")
+    if not inventory_item_gid or "gid://shopify/InventoryItem/" not in inventory_item_gid:
+        return None  # Formato de ID inesperado
 
-        inventory_item_gid = variants[0]["node"]["inventoryItem"].get("id")
+    return {
+        "variant_id": _gid_id(node.get("id")),
+        "inventory_item_id": _gid_id(inventory_item_gid),
+        "product_id": _gid_id((node.get("product") or {}).get("id")),
+    }
 
-        if not inventory_item_gid or "gid://shopify/InventoryItem/" not in inventory_item_gid:
-            return None  # Formato de ID inesperado
 
-        return inventory_item_gid.split("/")[-1]  # Extrae el ID numérico
+def search_variant(sku):
+    """Busca una variante por SKU en el índice de búsqueda de Shopify (lento, usar solo como respaldo)."""
+    data = graphql({"query": VARIANT_BY_SKU_QUERY, "variables": {"query": f"sku:{sku}"}})
+    variants = data.get("data", {}).get("productVariants", {}).get("edges", [])
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error al obtener inventoryItemId para SKU {sku}: {e}") # Mensaje de error más descriptivo
-        return None  # O podrías relanzar la excepción si quieres que el error se propague
-    except (KeyError, TypeError) as e:  # Maneja posibles errores en la estructura del JSON
-        print(f"❌ Error al procesar la respuesta de Shopify para SKU {sku}: {e}")
-        return None
-    except Exception as e: #Cualquier otro error
-        print(f"❌ Error inesperado al obtener inventoryItemId para SKU {sku}: {e}")
+    if not variants:
         return None
 
+    return _variant_entry(variants[0]["node"])
 
-def get_inventory_item_id(sku):
-    """Obtiene el inventoryItemId basado en el SKU."""
-    query = {
-        "query": f"""
-        {{
-          productVariants(first: 1, query: "sku:{sku}") {{
-            edges {{
-              node {{
-                id
-                sku
-                inventoryItem {{
-                  id
-                }}
-              }}
-            }}
-          }}
-        }}
-        """
-    }
 
-    response = requests.post(GRAPHQL_URL, json=query, headers=HEADERS)
-    response.raise_for_status()  # Lanza excepción para manejar errores
+# --- Índice local SKU -> variante / inventoryItem / producto ---
+# Se construye con un recorrido paginado del catálogo, se guarda en disco y se
+# refresca en segundo plano pidiendo solo las variantes modificadas desde el último
+# recorrido. Así las actualizaciones de stock no hacen búsquedas por SKU.
 
-    data = response.json()
-    variants = data.get("data", {}).get("productVariants", {}).get("edges", [])
+SKU_INDEX_FILE = "config/shopify_sku_index.json"
+SKU_INDEX_REFRESH_SECONDS = int(os.getenv("SHOPIFY_SKU_INDEX_REFRESH_SECONDS", "300"))
+SKU_INDEX_REBUILD_SECONDS = int(os.getenv("SHOPIFY_SKU_INDEX_REBUILD_SECONDS", "86400"))
+VARIANTS_PAGE_SIZE = 250  # Máximo permitido por Shopify
 
-    if not variants:
-        return None
-
-    inventory_item_gid = variants[0]["node"]["inventoryItem"].get("id")
-    if not inventory_item_gid or "gid://shopify/InventoryItem/" not in inventory_item_gid:
-        return None
+VARIANTS_PAGE_QUERY = """
+query ($cursor: String, $query: String) {
+  productVariants(first: %d, after: $cursor, query: $query) {
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    edges {
+      node {
+        id
+        sku
+        product {
+          id
+        }
+        inventoryItem {
+          id
+        }
+      }
+    }
+  }
+}
+""" % VARIANTS_PAGE_SIZE
+
+_sku_index = {"skus": {}, "synced_at": None, "built_at": None}
+_sku_index_loaded = False
+_sku_index_lock = threading.RLock()
+_sku_index_thread = None
+
+
+def _iter_variants(search=None):
+    """Recorre las variantes del catálogo página por página."""
+    cursor = None
+    while True:
+        payload = {"query": VARIANTS_PAGE_QUERY, "variables": {"cursor": cursor, "query": search}}
+        page = graphql(payload).get("data", {}).get("productVariants", {})
+        for edge in page.get("edges", []):
+            yield edge["node"]
+
+        page_info = page.get("pageInfo", {})
+        if not page_info.get("hasNextPage"):
+            return
+        cursor = page_info.get("endCursor")
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _load_sku_index():
+    global _sku_index, _sku_index_loaded
+    with _sku_index_lock:
+        if _sku_index_loaded:
+            return
+        try:
+            with open(SKU_INDEX_FILE, "r") as f:
+                _sku_index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        _sku_index_loaded = True
+
+
+def _save_sku_index():
+    """Guarda el índice de forma atómica (archivo temporal + rename)."""
+    with _sku_index_lock:
+        os.makedirs(os.path.dirname(SKU_INDEX_FILE), exist_ok=True)
+        tmp_path = f"{SKU_INDEX_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_sku_index, f)
+        os.replace(tmp_path, SKU_INDEX_FILE)
+
+
+def _index_variants(variants, skus):
+    for node in variants:
+        sku = (node.get("sku") or "").strip()
+        entry = _variant_entry(node)
+        if sku and entry:
+            skus[sku] = entry
+
+
+def _merge_into_index(changed):
+    """
+    Agrega entradas al índice quitando los SKUs viejos de esas mismas variantes
+    (si un SKU se renombró de A a B, A ya no debe apuntar a la variante). Llamar con _sku_index_lock.
+    """
+    changed_variants = {entry["variant_id"] for entry in changed.values()}
+    skus = _sku_index["skus"]
+    for sku in [sku for sku, entry in skus.items() if entry.get("variant_id") in changed_variants and sku not in changed]:
+        del skus[sku]
+    skus.update(changed)
+
+
+def build_sku_index():
+    """Reconstruye el índice completo recorriendo todo el catálogo."""
+    global _sku_index
+    started_at = _utc_now()
+    skus = {}
+    _index_variants(_iter_variants(), skus)
+
+    with _sku_index_lock:
+        _sku_index = {"skus": skus, "synced_at": started_at, "built_at": started_at}
+        _save_sku_index()
+    print(f"Índice de SKUs de Shopify reconstruido: {len(skus)} SKUs.")
+
+
+def refresh_sku_index():
+    """Incorpora al índice solo las variantes modificadas desde la última sincronización."""
+    _load_sku_index()
+    synced_at = _sku_index.get("synced_at")
+    built_at = _sku_index.get("built_at")
+
+    # Sin índice o con un índice muy viejo se reconstruye completo (así se limpian variantes borradas)
+    if not synced_at or not built_at or _age_seconds(built_at) > SKU_INDEX_REBUILD_SECONDS:
+        build_sku_index()
+        return
+
+    started_at = _utc_now()
+    changed = {}
+    _index_variants(_iter_variants(f"updated_at:>'{synced_at}'"), changed)
+
+    with _sku_index_lock:
+        _merge_into_index(changed)
+        _sku_index["synced_at"] = started_at
+        _save_sku_index()
+
+
+def _age_seconds(timestamp):
+    synced = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - synced).total_seconds()
+
+
+def _refresh_sku_index_periodically():
+    while True:
+        try:
+            refresh_sku_index()
+        except Exception as e:
+            print(f"❌ Error al refrescar el índice de SKUs: {e}")
+        time.sleep(SKU_INDEX_REFRESH_SECONDS)
+
+
+def _ensure_sku_index_refresher():
+    """Arranca el refresco en segundo plano la primera vez que se usa el índice (también bajo gunicorn)."""
+    global _sku_index_thread
+    with _sku_index_lock:
+        if _sku_index_thread is None:
+            _sku_index_thread = threading.Thread(target=_refresh_sku_index_periodically, daemon=True)
+            _sku_index_thread.start()
+
+
+def lookup_sku(sku):
+    """
+    Devuelve {variant_id, inventory_item_id, product_id} de un SKU desde el índice local.
+
+    Si el SKU no está (ej. se creó después del último refresco), se busca una vez en
+    Shopify y se agrega al índice.
+    """
+    _load_sku_index()
+    _ensure_sku_index_refresher()
+
+    entry = _sku_index["skus"].get(sku)
+    metrics.record_cache("shopify_sku_index", hits=int(bool(entry)), misses=int(not entry))
+    if entry:
+        return entry
+
+    entry = search_variant(sku)
+    if entry:
+        with _sku_index_lock:
+            _merge_into_index({sku: entry})
+            _save_sku_index()
+    return entry
 
-    return inventory_item_gid.split("/")[-1]
+
+def forget_sku(sku):
+    """Quita un SKU del índice (ej. cuando Shopify ya no reconoce su inventoryItem)."""
+    with _sku_index_lock:
+        if _sku_index["skus"].pop(sku, None) is not None:
+            _save_sku_index()
 
 
-def get_location_id():
-    """Obtiene el ID de la ubicación."""
-    query = {
-        "query": """
-        query {
-          locations(first: 1) {  # Obtén solo la primera ubicación
-            edges {
-              node {
-                id
-                name
+def get_inventory_item_id(sku):
+    """Obtiene el inventoryItemId basado en el SKU."""
+    entry = lookup_sku(sku)
+    return entry["inventory_item_id"] if entry else None
+
+
+_locations = None  # Cache de ubicaciones para toda la vida del proceso
+_locations_lock = threading.Lock()
+
+
+def get_locations():
+    """Obtiene las ubicaciones de la tienda como lista de {id, name} (se consultan una sola vez)."""
+    global _locations
+    with _locations_lock:
+        if _locations is not None:
+            return _locations
+
+        query = {
+            "query": """
+            query {
+              locations(first: 250) {
+                edges {
+                  node {
+                    id
+                    name
+                  }
+                }
               }
             }
-          }
+            """
         }
-        """
-    }
 
-    response = requests.post(GRAPHQL_URL, json=query, headers=HEADERS)
-    response.raise_for_status()
+        data = graphql(query)
+        edges = data.get("data", {}).get("locations", {}).get("edges", [])
+        _locations = [{"id": _gid_id(edge["node"]["id"]), "name": edge["node"]["name"]} for edge in edges]
+        return _locations
+
 
-    data = response.json()
-    locations = data.get("data", {}).get("locations", {}).get("edges", [])
+def get_location_id(location=None):
+    """
+    Obtiene el ID numérico de una ubicación.
 
+    :param location: ID o nombre de la ubicación; si no se indica, la primera de la tienda.
+    :return: ID numérico o None si no existe.
+    """
+    locations = get_locations()
     if not locations:
         return None
+    if location is None:
+        return locations[0]["id"]
 
-    return locations[0]["node"]["id"].split("/")[-1]  # Devuelve solo el ID numérico
+    for loc in locations:
+        if str(location) in (loc["id"], loc["name"]):
+            return loc["id"]
+    return None
 
 
 def set_stock(inventory_item_id, location_id, stock):
@@ -185,12 +464,134 @@ def set_stock(inventory_item_id, location_id, stock):
         "available": stock,
     }
 
-    response = requests.post(url, json=payload, headers=HEADERS)
+    response = http_client.post(url, json=payload)
     response.raise_for_status()  # Lanza excepción para manejar errores
 
     return response.json()  # Devuelve el JSON de la respuesta
 
 
+SET_QUANTITIES_LIMIT = 250  # Máximo de cantidades por llamada a inventorySetQuantities
+
+SET_QUANTITIES_MUTATION = """
+mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+  inventorySetQuantities(input: $input) {
+    inventoryAdjustmentGroup {
+      id
+    }
+    userErrors {
+      field
+      message
+      code
+    }
+  }
+}
+"""
+
+# Códigos de userErrors que indican que el inventoryItem del índice ya no sirve
+STALE_INVENTORY_ITEM_CODES = {"INVALID_INVENTORY_ITEM", "NON_EXISTENT_INVENTORY_ITEM"}
+
+
+def set_stock_batch(updates):
+    """
+    Actualiza el stock de muchos inventoryItems con la mutación inventorySetQuantities.
+
+    :param updates: Lista de {inventory_item_id, location_id, stock} (IDs numéricos) con
+        'sku' opcional: si Shopify ya no reconoce el inventoryItem, el SKU se quita del índice.
+    :return: Lista paralela a updates con None si se aplicó o el mensaje de error.
+    """
+    errors = [None] * len(updates)
+
+    for start in range(0, len(updates), SET_QUANTITIES_LIMIT):
+        chunk = updates[start:start + SET_QUANTITIES_LIMIT]
+        variables = {
+            "input": {
+                "name": "available",
+                "reason": "correction",
+                "ignoreCompareQuantity": True,
+                "quantities": [
+                    {
+                        "inventoryItemId": f"gid://shopify/InventoryItem/{update['inventory_item_id']}",
+                        "locationId": f"gid://shopify/Location/{update['location_id']}",
+                        "quantity": update["stock"],
+                    }
+                    for update in chunk
+                ],
+            }
+        }
+
+        try:
+            data = graphql({"query": SET_QUANTITIES_MUTATION, "variables": variables})
+        except requests.exceptions.RequestException as e:
+            errors[start:start + len(chunk)] = [f"Error en Shopify: {e}"] * len(chunk)
+            continue
+
+        if data.get("errors"):
+            errors[start:start + len(chunk)] = [f"Error en Shopify: {data['errors']}"] * len(chunk)
+            continue
+
+        # Los userErrors indican la posición de la cantidad en 'field' (input.quantities.N...)
+        for user_error in data.get("data", {}).get("inventorySetQuantities", {}).get("userErrors", []):
+            field = user_error.get("field") or []
+            if len(field) > 2 and field[1] == "quantities" and str(field[2]).isdigit():
+                index = start + int(field[2])
+                errors[index] = user_error.get("message")
+                if user_error.get("code") in STALE_INVENTORY_ITEM_CODES and updates[index].get("sku"):
+                    forget_sku(updates[index]["sku"])  # Se volverá a buscar en el próximo intento
+            else:
+                for index in range(start, start + len(chunk)):
+                    errors[index] = errors[index] or user_error.get("message")
+
+    return errors
+
+
+def sync_stock_batch(pairs):
+    """
+    Actualiza el stock de muchos SKUs resolviéndolos con el índice local y escribiendo en lote.
+
+    :param pairs: Iterable de {sku, stock} con 'location' opcional (ID o nombre).
+    :return: Lista de resultados por SKU en el orden de entrada.
+    """
+    results = []
+    updates = []
+    pending = []  # Índices de results que esperan la escritura
+
+    for pair in pairs:
+        sku, new_stock, error = validate_pair(pair)
+        if error:
+            results.append(error)
+            continue
+
+        try:
+            new_stock = int(new_stock)
+        except (TypeError, ValueError):
+            results.append({"sku": sku, "stock": new_stock, "status": "error", "error": "Stock inválido"})
+            continue
+
+        location_id = get_location_id(pair.get("location"))
+        if not location_id:
+            results.append({"sku": sku, "stock": new_stock, "status": "error", "error": "No se encontró location_id"})
+            continue
+
+        try:
+            inventory_item_id = get_inventory_item_id(sku)
+        except requests.exceptions.RequestException as e:
+            results.append({"sku": sku, "stock": new_stock, "status": "error", "error": f"Error en Shopify: {e}"})
+            continue
+        if not inventory_item_id:
+            results.append({"sku": sku, "stock": new_stock, "status": "not_found"})
+            continue
+
+        pending.append(len(results))
+        results.append({"sku": sku, "stock": new_stock, "status": "ok"})
+        updates.append({"sku": sku, "inventory_item_id": inventory_item_id, "location_id": location_id, "stock": new_stock})
+
+    for index, error in zip(pending, set_stock_batch(updates)):
+        if error:
+            results[index].update({"status": "error", "error": error})
+
+    return results
+
+
 # --- Rutas de Flask ---
 
 @app.route("/update_stock", methods=["POST"])
@@ -216,11 +617,33 @@ def update_stock():
         return jsonify({"success": True, "message": "Stock actualizado correctamente"}), 200
 
     except requests.exceptions.HTTPError as e:  # Captura errores HTTP específicos
+        if e.response.status_code == 404:
+            forget_sku(sku)  # El inventoryItem del índice ya no existe; se volverá a buscar
         return jsonify({"success": False, "error": f"Error en Shopify: {e}"}), e.response.status_code
     except Exception as e:
         return jsonify({"success": False, "error": f"Error: {str(e)}"}), 500
 
 
+@app.route("/update_stock/bulk", methods=["POST"])
+def update_stock_bulk():
+    """
+    Actualiza el stock de muchos SKUs (arreglo JSON o NDJSON de pares {sku, stock}).
+
+    Cada par puede traer 'location' (ID o nombre) para escribir en otra ubicación.
+    Las escrituras se agrupan en llamadas a inventorySetQuantities.
+    """
+    try:
+        pairs = parse_stock_pairs(request)
+        get_locations()  # Falla antes de procesar si no se puede consultar la tienda
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except requests.exceptions.HTTPError as e:
+        return jsonify({"success": False, "error": f"Error en Shopify: {e}"}), e.response.status_code
+
+    results = sync_stock_batch(pairs)
+    return jsonify({"success": True, "summary": summarize(results), "results": results}), 200
+
+
 # ... (resto de rutas)
 
 if __name__ == '__main__':
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import Flask, jsonify
+
+from concurrent.futures import ThreadPoolExecutor
+
+from auth import load_tokens
+from bulk import summarize
+from inventario import Inventario
+from logi import obtener_stock
+import metrics
+import ml
+import shopi
+
+app = Flask(__name__)
+metrics.instrument_app(app)  # Latencia por ruta y /metrics
+
+# --- Estado de sincronización ---
+# Se guarda el último stock enviado con éxito por canal y SKU. En cada corrida solo
+# se escriben los SKUs cuyo stock en Logi difiere de ese valor.
+
+SYNC_STATE_DB = "config/sync_state.db"
+SHOPIFY_CHANNEL = "shopify"
+
+_db_lock = threading.Lock()
+
+
+def _connect():
+    os.makedirs(os.path.dirname(SYNC_STATE_DB), exist_ok=True)
+    conn = sqlite3.connect(SYNC_STATE_DB)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pushed_stock (
+            channel TEXT NOT NULL,
+            sku TEXT NOT NULL,
+            stock INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            pushed_at REAL NOT NULL,
+            PRIMARY KEY (channel, sku)
+        )
+        """
+    )
+    return conn
+
+
+def load_pushed(channel):
+    """Devuelve {sku: stock} con lo último enviado con éxito a un canal."""
+    with _db_lock:
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT sku, stock FROM pushed_stock WHERE channel = ?", (channel,))
+            return dict(rows.fetchall())
+        finally:
+            conn.close()
+
+
+def record_pushed(channel, results):
+    """Guarda los SKUs que se escribieron (o que no existen en el canal) para no repetirlos."""
+    now = time.time()
+    rows = [(channel, r["sku"], r["stock"], r["status"], now) for r in results if r["status"] in ("ok", "not_found")]
+    if not rows:
+        return
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pushed_stock (channel, sku, stock, status, pushed_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            conn.close()
+
+
+def stock_por_sku(productos):
+    """Convierte el inventario (Inventario o salida de decode_and_format) en {pro_sku: total_stock}."""
+    if isinstance(productos, Inventario):
+        return productos.stock_por_sku()
+
+    stock = {}
+    for producto in productos:
+        sku = producto.get("pro_sku")
+        if sku:
+            stock[sku] = producto.get("total_stock", 0)
+    return stock
+
+
+def diff_stock(actual, enviado):
+    """Devuelve los pares {sku, stock} que cambiaron respecto a lo último enviado."""
+    return [{"sku": sku, "stock": stock} for sku, stock in actual.items() if enviado.get(sku) != stock]
+
+
+# --- Canales ---
+
+def _ml_channels():
+    """Un canal por cada cuenta de MercadoLibre con tokens guardados (cada una con su propio límite de tasa)."""
+    try:
+        tokens = load_tokens()
+    except (FileNotFoundError, ValueError) as e:
+        logging.warning(f"Sin tokens de MercadoLibre, se omite el canal: {e}")
+        return {}
+
+    channels = {}
+    for cuenta in tokens:
+        def push(pairs, cuenta=cuenta):
+            # Token y usuario de la cuenta (el usuario se consulta una vez por proceso)
+            access_token, user_id, site_id = ml.account_session(cuenta)
+            return ml.sync_stock_batch(access_token, user_id, site_id, pairs, cuenta)
+
+        channels[f"mercadolibre:{cuenta}"] = push
+    return channels
+
+
+def get_channels():
+    """Canales de destino: {nombre: función(pairs) -> resultados por SKU}."""
+    channels = {SHOPIFY_CHANNEL: shopi.sync_stock_batch}
+    channels.update(_ml_channels())
+    return channels
+
+
+def run_sync(productos=None, channels=None):
+    """
+    Envía a cada canal solo los SKUs cuyo stock cambió desde el último envío exitoso.
+
+    :param productos: Inventario o salida de decode_and_format; por defecto el snapshot actual de Logi.
+    :param channels: {nombre: función(pairs)}; por defecto get_channels().
+    :return: Reporte por canal.
+    """
+    if productos is None:
+        productos = obtener_stock()
+    if not productos:
+        raise ValueError("No se pudo obtener el inventario de Logi.")
+
+    actual = stock_por_sku(productos)
+    channels = get_channels() if channels is None else channels
+
+    def _sync_channel(channel):
+        pairs = diff_stock(actual, load_pushed(channel))
+        try:
+            results = channels[channel](pairs) if pairs else []
+        except Exception as e:
+            # Un canal caído no frena a los demás; sus SKUs se reintentan en la próxima corrida
+            logging.error(f"Error al sincronizar {channel}: {e}")
+            return {"total": len(actual), "changed": len(pairs), "error": str(e)}
+        record_pushed(channel, results)
+
+        logging.info(f"Sincronización {channel}: {len(pairs)} de {len(actual)} SKUs con cambios.")
+        return {
+            "total": len(actual),
+            "changed": len(pairs),
+            "summary": summarize(results),
+            "errors": [r for r in results if r["status"] == "error"],
+        }
+
+    # Los canales (Shopify y cada cuenta de MercadoLibre) se sincronizan a la vez
+    with ThreadPoolExecutor(max_workers=max(1, len(channels))) as executor:
+        return dict(zip(channels, executor.map(_sync_channel, channels)))
+
+
+# --- Rutas de Flask ---
+
+@app.route("/sync", methods=["POST"])
+def sync_route():
+    """Ejecuta una sincronización de Logi hacia MercadoLibre y Shopify."""
+    try:
+        return jsonify(run_sync()), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 502
+
+
+if __name__ == "__main__":
+    # Permite correr la sincronización desde cron: python sync.py
+    print(json.dumps(run_sync(), indent=4, ensure_ascii=False))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import barcodes
+
+# Resultados de la validación anterior con EAN13 de python-barcode (logi.py antes de
+# barcodes.py): 13 caracteres con los primeros 12 decimales, o 12 con los primeros 11.
+CASOS = [
+    ("7701234567890", True),
+    ("7701234567891", True),  # El dígito de control no se revisa
+    ("770123456789X", True),  # Solo cuentan los primeros 12
+    ("770123456789\x00", True),
+    ("77012345678X0", False),
+    ("7701234\x0067890", False),
+    ("\x00701234567890", False),
+    ("770123456789", True),
+    ("77012345678X", True),  # UPC: solo cuentan los primeros 11
+    ("77012345678\x00", True),
+    ("7701234567X9", False),
+    ("\x0077012345678", False),
+    ("770123456²890", False),  # isdigit pero no isdecimal: int() fallaba
+    ("٧٧٠١٢٣٤٥٦٧٨٩٠", True),  # Dígitos decimales no ASCII
+    ("77012345678", False),
+    ("77012345678901", False),
+    ("", False),
+    ("             ", False),
+]
+
+
+@pytest.fixture(autouse=True)
+def _cache_vacia():
+    barcodes._cache.clear()
+    yield
+    barcodes._cache.clear()
+
+
+@pytest.mark.parametrize("codigo, esperado", CASOS)
+def test_validar_codigo_barras(codigo, esperado):
+    assert barcodes.validar_codigo_barras(codigo) is esperado
+    assert barcodes.validar_codigo_barras(codigo) is esperado  # Desde la cache
+
+
+def test_validar_codigos_barras_igual_que_uno_por_uno():
+    codigos = [codigo for codigo, _ in CASOS] * 2
+    esperado = np.array([valido for _, valido in CASOS] * 2)
+    np.testing.assert_array_equal(barcodes.validar_codigos_barras(codigos), esperado)
+    np.testing.assert_array_equal(barcodes.validar_codigos_barras(codigos), esperado)  # Desde la cache
+
+
+@pytest.mark.parametrize("codigo, esperado", [
+    ("7701234567899", False),
+    ("4006381333931", True),
+    ("036000291452", True),
+    ("036000291453", False),
+    ("96385074", True),
+    ("96385075", False),
+    ("40063813339\x00" + "1", False),
+    ("٤٠٠٦٣٨١٣٣٣٩٣١", False),
+    ("1234567", False),
+])
+def test_validar_digito_control(codigo, esperado):
+    assert barcodes.validar_digito_control(codigo) is esperado
+    assert barcodes.validar_digitos_control([codigo]).tolist() == [esperado]
@@ -0,0 +1,75 @@
+import math
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+import inventario
+
+FECHAS = [
+    "2023-06-15 10:20:30",
+    "1970-01-01 00:00:00",  # Fuera del rango rápido: va por strptime
+    "3000-01-01 00:00:00",
+    "2024-02-29 23:59:59",
+    "2023-02-29 12:00:00",  # Inválidas
+    "2023-13-01 12:00:00",
+    "2023-04-31 12:00:00",
+    "2023-06-15 24:00:00",
+    "2023-06-15 10:60:00",
+    "2023-06-15 10:20:60",
+    "2023-06-15T10:20:30",
+    "2023-06-15 10:20:3",
+    "2023-6-15 10:20:30 ",
+    "２０２３-06-15 10:20:30",  # Dígitos no ASCII: strptime los acepta
+    "",
+    # Cambios de horario de Europe/Madrid (hueco y hora repetida)
+    "2023-03-26 02:00:00",
+    "2023-03-26 02:30:00",
+    "2023-10-29 02:30:00",
+    # Cambios de 30 minutos de Australia/Lord_Howe
+    "2023-10-01 01:59:59",
+    "2023-10-01 02:00:00",
+    "2023-10-01 02:15:00",
+    "2023-10-01 02:30:00",
+    "2023-10-01 02:45:00",
+    "2023-04-02 01:30:00",
+    "2023-04-02 01:45:00",
+    "2023-04-02 02:00:00",
+    # India (+05:30) y Nepal (+05:45)
+    "2023-06-15 00:00:00",
+    "2023-06-15 23:59:59",
+]
+
+
+def _strptime(fecha):
+    try:
+        return datetime.strptime(fecha, inventario.FORMATO_FECHA).timestamp()
+    except ValueError:
+        return math.nan
+
+
+@pytest.fixture(params=["UTC", "America/Bogota", "Europe/Madrid", "Australia/Lord_Howe", "Asia/Kolkata", "Asia/Kathmandu"])
+def zona_horaria(request):
+    anterior = os.environ.get("TZ")
+    os.environ["TZ"] = request.param
+    time.tzset()
+    yield request.param
+    if anterior is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = anterior
+    time.tzset()
+
+
+def test_parsear_fechas_igual_que_strptime(zona_horaria):
+    resultado = inventario.parsear_fechas(FECHAS).tolist()
+    for fecha, obtenido in zip(FECHAS, resultado):
+        esperado = _strptime(fecha)
+        assert obtenido == esperado or (math.isnan(obtenido) and math.isnan(esperado)), (zona_horaria, fecha)
+
+
+def test_parsear_fechas_cada_minuto_del_cambio_de_lord_howe(zona_horaria):
+    fechas = [f"2023-10-01 {h:02d}:{m:02d}:{s:02d}" for h in (1, 2, 3) for m in range(60) for s in (0, 59)]
+    fechas += [f"2023-04-02 {h:02d}:{m:02d}:{s:02d}" for h in (1, 2) for m in range(60) for s in (0, 59)]
+    assert inventario.parsear_fechas(fechas).tolist() == [_strptime(fecha) for fecha in fechas]